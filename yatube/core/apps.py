@@ -1,5 +1,15 @@
 from django.apps import AppConfig
+from django.core.signals import request_started
+from django.db.backends.signals import connection_created
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from .db import check_connections, configure_sqlite
+        from . import metrics, querylog
+        connection_created.connect(configure_sqlite)
+        connection_created.connect(metrics.instrument_connection)
+        connection_created.connect(querylog.instrument_connection)
+        request_started.connect(check_connections)
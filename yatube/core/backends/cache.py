@@ -0,0 +1,43 @@
+"""Бэкенды кэша Django, считающие попадания и промахи для core.metrics.
+
+Метка в метриках — ключ ``ALIAS`` из настроек псевдонима (его ставит
+``cache_alias`` в settings), иначе ``LOCATION``.
+"""
+from django.core.cache.backends import filebased, locmem, memcached
+
+from core import metrics
+
+_missing = object()
+
+
+class MetricsMixin:
+    def __init__(self, location, params):
+        super().__init__(location, params)
+        self.alias = params.get('ALIAS', location)
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _missing, version)
+        if value is _missing:
+            metrics.record_cache(self.alias, misses=1)
+            return default
+        metrics.record_cache(self.alias, hits=1)
+        return value
+
+
+class LocMemCache(MetricsMixin, locmem.LocMemCache):
+    pass
+
+
+class FileBasedCache(MetricsMixin, filebased.FileBasedCache):
+    pass
+
+
+class MemcachedCache(MetricsMixin, memcached.MemcachedCache):
+    # У остальных get_many идёт через get и уже посчитан.
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = super().get_many(keys, version)
+        metrics.record_cache(
+            self.alias, hits=len(found), misses=len(keys) - len(found)
+        )
+        return found
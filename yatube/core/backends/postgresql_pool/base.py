@@ -0,0 +1,72 @@
+"""PostgreSQL с пулом соединений внутри процесса.
+
+Соединение берётся из ``psycopg2.pool.ThreadedConnectionPool`` и при
+закрытии (в конце запроса, ``CONN_MAX_AGE = 0``) возвращается в пул,
+а не рвётся. Размер пула — ``OPTIONS['MIN_CONNS']`` и
+``OPTIONS['MAX_CONNS']``; с ``CONN_HEALTH_CHECKS`` соединение из пула
+перед выдачей проверяется ``SELECT 1``.
+"""
+import threading
+
+from django.db.backends.postgresql import base
+from psycopg2 import pool
+
+POOL_OPTIONS = ('MIN_CONNS', 'MAX_CONNS')
+
+_pools = {}
+_lock = threading.Lock()
+
+
+def is_usable(connection):
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        if not connection.autocommit:
+            connection.rollback()
+    except base.Database.Error:
+        return False
+    return True
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        for option in POOL_OPTIONS:
+            conn_params.pop(option, None)
+        return conn_params
+
+    def get_pool(self, conn_params):
+        with _lock:
+            if self.alias not in _pools:
+                options = self.settings_dict['OPTIONS']
+                _pools[self.alias] = pool.ThreadedConnectionPool(
+                    options.get('MIN_CONNS', 1), options.get('MAX_CONNS', 10),
+                    **conn_params
+                )
+            return _pools[self.alias]
+
+    def get_new_connection(self, conn_params):
+        connections = self.get_pool(conn_params)
+        connection = connections.getconn()
+        if (self.settings_dict.get('CONN_HEALTH_CHECKS')
+                and not is_usable(connection)):
+            connections.putconn(connection, close=True)
+            connection = connections.getconn()
+        # Как в base.DatabaseWrapper.get_new_connection.
+        options = self.settings_dict['OPTIONS']
+        try:
+            self.isolation_level = options['isolation_level']
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                # Незавершённую транзакцию пул откатит сам.
+                _pools[self.alias].putconn(
+                    self.connection, close=bool(self.connection.closed)
+                )
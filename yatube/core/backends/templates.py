@@ -0,0 +1,29 @@
+"""Шаблонный бэкенд Django, замеряющий время рендеринга для core.metrics.
+
+Замеряется только шаблон, отрендеренный view; ``{% include %}`` и
+``{% extends %}`` входят в его время.
+"""
+import time
+
+from django.template.backends import django
+
+from core import metrics
+
+
+class Template(django.Template):
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.record_template(time.perf_counter() - started)
+
+
+class DjangoTemplates(django.DjangoTemplates):
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return Template(
+            super().get_template(template_name).template, self
+        )
@@ -0,0 +1,27 @@
+"""Настройка соединений с базой.
+
+``configure_sqlite`` выполняет ``SQLITE_PRAGMAS`` для каждого нового
+соединения SQLite; режим журнала хранится в файле базы и ставится
+миграцией ``core.0001_sqlite_wal``. ``check_connections`` в начале
+запроса проверяет постоянные соединения (``CONN_MAX_AGE``)
+с ``CONN_HEALTH_CHECKS``: разорванное СУБД или прокси соединение
+закрывается и открывается заново, а не роняет запрос.
+"""
+from django.conf import settings
+from django.db import connections
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for pragma, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {pragma} = {value}')
+
+
+def check_connections(**kwargs):
+    for connection in connections.all():
+        if (connection.connection is not None
+                and connection.settings_dict.get('CONN_HEALTH_CHECKS')
+                and not connection.is_usable()):
+            connection.close()
@@ -0,0 +1,278 @@
+"""Метрики запросов для продакшена.
+
+``MetricsMiddleware`` собирает по каждому запросу время ответа, число
+и время запросов к базе (обёртка ``execute_wrapper`` ставится на каждое
+новое соединение), попадания и промахи кэша (бэкенды
+``core.backends.cache``) и время рендеринга шаблонов
+(``core.backends.templates``). Итоги складываются в счётчики процесса
+по имени view и пишутся строкой JSON в лог ``core.metrics``.
+
+Каждый воркер раз в ``METRICS_FLUSH_SECONDS`` кладёт свои счётчики
+в общий кэш ``METRICS_CACHE``; ``/metrics/`` складывает счётчики всех
+воркеров и отдаёт их в текстовом формате Prometheus.
+"""
+import bisect
+import itertools
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+WORKER = f'{socket.gethostname()}:{os.getpid()}'
+WORKERS_KEY = 'metrics:workers'
+
+# Границы гистограммы времени ответа, секунды.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+METRICS = {
+    'yatube_requests_total': ('counter', 'Запросы.'),
+    'yatube_request_errors_total': ('counter', 'Ответы с кодом 5xx.'),
+    'yatube_request_duration_seconds': (
+        'histogram', 'Время ответа.'
+    ),
+    'yatube_db_queries_total': ('counter', 'Запросы к базе.'),
+    'yatube_db_query_seconds_total': (
+        'counter', 'Время запросов к базе.'
+    ),
+    'yatube_cache_hits_total': ('counter', 'Попадания в кэш.'),
+    'yatube_cache_misses_total': ('counter', 'Промахи кэша.'),
+    'yatube_template_render_seconds_total': (
+        'counter', 'Время рендеринга шаблонов.'
+    ),
+}
+
+_sample = ContextVar('sample', default=None)
+
+
+class Sample:
+    """Что насчитал один запрос."""
+
+    __slots__ = ('queries', 'db_time', 'template_time', 'cache')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.cache = defaultdict(lambda: [0, 0])
+
+
+def record_query(execute, sql, params, many, context):
+    """Обёртка ``execute_wrapper`` для каждого соединения."""
+    sample = _sample.get()
+    if sample is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        sample.queries += 1
+        sample.db_time += time.perf_counter() - started
+
+
+def instrument_connection(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def record_cache(alias, hits=0, misses=0):
+    sample = _sample.get()
+    if sample is not None:
+        counts = sample.cache[alias]
+        counts[0] += hits
+        counts[1] += misses
+
+
+def record_template(seconds):
+    sample = _sample.get()
+    if sample is not None:
+        sample.template_time += seconds
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    # Метка без URL: число рядов не растёт от неизвестных адресов.
+    return match.view_name if match else '<unresolved>'
+
+
+class ViewStats:
+    """Сумма по одной view; ``buckets[i]`` — ответы не дольше
+    ``BUCKETS[i]``, но дольше предыдущей границы."""
+
+    __slots__ = (
+        'requests', 'errors', 'queries', 'db_time', 'template_time',
+        'duration', 'buckets', 'cache',
+    )
+
+    def __init__(self):
+        self.requests = self.errors = self.queries = 0
+        self.db_time = self.template_time = self.duration = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.cache = defaultdict(lambda: [0, 0])
+
+    def series(self, view):
+        labels = (('view', view),)
+        yield 'yatube_requests_total', labels, self.requests
+        yield 'yatube_request_errors_total', labels, self.errors
+        yield 'yatube_db_queries_total', labels, self.queries
+        yield 'yatube_db_query_seconds_total', labels, self.db_time
+        yield ('yatube_template_render_seconds_total', labels,
+               self.template_time)
+        bounds = [str(bound) for bound in BUCKETS] + ['+Inf']
+        for bound, count in zip(bounds, itertools.accumulate(self.buckets)):
+            yield ('yatube_request_duration_seconds_bucket',
+                   labels + (('le', bound),), count)
+        yield 'yatube_request_duration_seconds_sum', labels, self.duration
+        yield 'yatube_request_duration_seconds_count', labels, self.requests
+        for alias, (hits, misses) in self.cache.items():
+            cache_labels = labels + (('cache', alias),)
+            yield 'yatube_cache_hits_total', cache_labels, hits
+            yield 'yatube_cache_misses_total', cache_labels, misses
+
+
+class Registry:
+    """Счётчики процесса по view."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = defaultdict(ViewStats)
+        self.flushed = 0.0
+
+    def observe(self, view, sample, duration, status):
+        with self.lock:
+            stats = self.views[view]
+            stats.requests += 1
+            stats.errors += status >= 500
+            stats.queries += sample.queries
+            stats.db_time += sample.db_time
+            stats.template_time += sample.template_time
+            stats.duration += duration
+            stats.buckets[bisect.bisect_left(BUCKETS, duration)] += 1
+            for alias, (hits, misses) in sample.cache.items():
+                counts = stats.cache[alias]
+                counts[0] += hits
+                counts[1] += misses
+
+    def snapshot(self):
+        """``{(метрика, метки): значение}`` — так счётчики хранятся
+        в общем кэше и складываются между воркерами."""
+        with self.lock:
+            return {
+                (name, labels): value
+                for view, stats in self.views.items()
+                for name, labels, value in stats.series(view)
+            }
+
+    def flush(self, force=False):
+        """Кладёт счётчики воркера в общий кэш не чаще
+        ``METRICS_FLUSH_SECONDS``."""
+        now = time.monotonic()
+        if not force and now - self.flushed < settings.METRICS_FLUSH_SECONDS:
+            return
+        self.flushed = now
+        cache = caches[settings.METRICS_CACHE]
+        cache.set(f'metrics:worker:{WORKER}', self.snapshot(),
+                  settings.METRICS_TTL)
+        # Гонка двух воркеров теряет одного из них лишь до его
+        # следующего сброса.
+        workers = cache.get(WORKERS_KEY) or set()
+        if WORKER not in workers:
+            cache.set(WORKERS_KEY, workers | {WORKER}, settings.METRICS_TTL)
+
+
+registry = Registry()
+
+
+def collect():
+    """Счётчики всех воркеров, сложенные вместе."""
+    registry.flush(force=True)
+    cache = caches[settings.METRICS_CACHE]
+    workers = cache.get(WORKERS_KEY) or set()
+    values = defaultdict(float)
+    snapshots = cache.get_many(
+        [f'metrics:worker:{worker}' for worker in sorted(workers)]
+    )
+    for snapshot in snapshots.values():
+        for key, value in snapshot.items():
+            values[key] += value
+    return values
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(name, value.replace('\\', r'\\').replace(
+            '"', r'\"'
+        ).replace('\n', r'\n'))
+        for name, value in labels
+    )
+    return f'{{{pairs}}}'
+
+
+def format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+def render(values):
+    """Текстовый формат Prometheus."""
+    lines = []
+    for family, (kind, description) in METRICS.items():
+        lines += [
+            f'# HELP {family} {description}', f'# TYPE {family} {kind}'
+        ]
+        for (name, labels), value in values.items():
+            if name == family or (
+                kind == 'histogram' and name.startswith(f'{family}_')
+            ):
+                lines.append(
+                    f'{name}{format_labels(labels)} {format_value(value)}'
+                )
+    return '\n'.join(lines) + '\n'
+
+
+def log(request, response, view, sample, duration):
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    logger.info(json.dumps({
+        'view': view,
+        'method': request.method,
+        'path': request.path,
+        'status': response.status_code,
+        'duration_ms': round(duration * 1000, 2),
+        'db_queries': sample.queries,
+        'db_ms': round(sample.db_time * 1000, 2),
+        'cache_hits': sum(hits for hits, _ in sample.cache.values()),
+        'cache_misses': sum(misses for _, misses in sample.cache.values()),
+        'template_ms': round(sample.template_time * 1000, 2),
+    }, ensure_ascii=False))
+
+
+class MetricsMiddleware:
+    """Первый в ``MIDDLEWARE``: время ответа включает все остальные."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sample = Sample()
+        token = _sample.set(sample)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _sample.reset(token)
+        duration = time.perf_counter() - started
+        view = view_name(request)
+        registry.observe(view, sample, duration, response.status_code)
+        log(request, response, view, sample, duration)
+        registry.flush()
+        return response
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+def journal_mode(mode):
+    def operation(apps, schema_editor):
+        connection = schema_editor.connection
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute(f'PRAGMA journal_mode = {mode}')
+    return operation
+
+
+class Migration(migrations.Migration):
+    """Переводит файл базы SQLite в WAL. Режим хранится в самом файле,
+    поэтому ставится один раз, а не при каждом соединении."""
+
+    # PRAGMA journal_mode не меняется внутри транзакции.
+    atomic = False
+
+    dependencies = []
+
+    operations = [
+        migrations.RunPython(journal_mode('WAL'), journal_mode('DELETE')),
+    ]
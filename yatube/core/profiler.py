@@ -0,0 +1,183 @@
+"""Выборочный профайлер запросов.
+
+``ProfilerMiddleware`` профилирует запрос, если в нём есть заголовок
+``X-Profile`` с токеном ``PROFILER_TOKEN`` или если запрос выпал
+с вероятностью ``PROFILER_SAMPLE_RATE``. Пока идёт запрос, отдельный
+поток раз в ``PROFILER_INTERVAL`` секунд снимает стек потока запроса
+через ``sys._current_frames``; стеки пишутся в ``PROFILER_DIR`` по имени
+view:
+
+- ``collapsed`` — строки ``кадр;кадр;... число`` дописываются
+  в ``<view>.collapsed`` для flamegraph.pl и speedscope;
+- ``speedscope`` — отдельный ``<view>/<время>.speedscope.json``
+  на запрос.
+"""
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
+
+from .metrics import view_name
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'HTTP_X_PROFILE'
+
+
+def short_path(filename):
+    if filename.startswith(settings.BASE_DIR):
+        return os.path.relpath(filename, settings.BASE_DIR)
+    if 'site-packages' in filename:
+        return filename.split('site-packages' + os.sep, 1)[1]
+    return filename
+
+
+def frame_name(code):
+    return f'{short_path(code.co_filename)}:{code.co_name}'
+
+
+class Sampler(threading.Thread):
+    """Снимает стек одного потока, пока не остановят."""
+
+    def __init__(self, thread_id, interval, stop_at):
+        super().__init__(name='profiler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        # Код, выше которого стек не интересен (сервер, WSGI).
+        self.stop_at = stop_at
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[self.stack(frame)] += 1
+
+    def stack(self, frame):
+        codes = []
+        while frame is not None:
+            codes.append(frame.f_code)
+            if frame.f_code is self.stop_at:
+                break
+            frame = frame.f_back
+        return tuple(reversed(codes))
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        return self.stacks
+
+
+def slug(view):
+    return re.sub(r'\W+', '_', view).strip('_') or 'unresolved'
+
+
+def write_collapsed(view, stacks):
+    path = os.path.join(settings.PROFILER_DIR, f'{slug(view)}.collapsed')
+    lines = ''.join(
+        ';'.join(map(frame_name, stack)) + f' {count}\n'
+        for stack, count in stacks.items()
+    )
+    # Одна запись в режиме дозаписи: строки параллельных запросов
+    # не перемешиваются.
+    with open(path, 'a', encoding='utf-8') as file:
+        file.write(lines)
+    return path
+
+
+def write_speedscope(view, stacks, interval):
+    directory = os.path.join(settings.PROFILER_DIR, slug(view))
+    os.makedirs(directory, exist_ok=True)
+    frames = {}
+    samples = []
+    for stack in stacks:
+        samples.append([
+            frames.setdefault(code, len(frames)) for code in stack
+        ])
+    weights = [count * interval for count in stacks.values()]
+    profile = {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'name': view,
+        'exporter': 'yatube',
+        'shared': {'frames': [
+            {
+                'name': code.co_name,
+                'file': short_path(code.co_filename),
+                'line': code.co_firstlineno,
+            }
+            for code in frames
+        ]},
+        'profiles': [{
+            'type': 'sampled',
+            'name': view,
+            'unit': 'seconds',
+            'startValue': 0,
+            'endValue': sum(weights),
+            'samples': samples,
+            'weights': weights,
+        }],
+    }
+    path = os.path.join(
+        directory,
+        f'{time.strftime("%Y%m%dT%H%M%S")}-{uuid.uuid4().hex[:8]}'
+        '.speedscope.json'
+    )
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(profile, file)
+    return path
+
+
+def write(view, stacks):
+    os.makedirs(settings.PROFILER_DIR, exist_ok=True)
+    if settings.PROFILER_FORMAT == 'speedscope':
+        return write_speedscope(view, stacks, settings.PROFILER_INTERVAL)
+    return write_collapsed(view, stacks)
+
+
+class ProfilerMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def requested(self, request):
+        token = settings.PROFILER_TOKEN
+        return bool(token) and constant_time_compare(
+            request.META.get(HEADER, ''), token
+        )
+
+    def __call__(self, request):
+        by_header = self.requested(request)
+        if not by_header and not (
+            settings.PROFILER_SAMPLE_RATE
+            and random.random() < settings.PROFILER_SAMPLE_RATE
+        ):
+            return self.get_response(request)
+        sampler = Sampler(
+            threading.get_ident(), settings.PROFILER_INTERVAL,
+            ProfilerMiddleware.__call__.__code__,
+        )
+        sampler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            stacks = sampler.stop()
+        if not stacks:
+            return response
+        try:
+            path = write(view_name(request), stacks)
+        except OSError:
+            # Профиль не должен ронять запрос.
+            logger.exception('Не удалось записать профиль')
+            return response
+        if by_header:
+            response['X-Profile-File'] = os.path.basename(path)
+        return response
@@ -0,0 +1,201 @@
+"""Журнал медленных запросов и поиск N+1.
+
+Включается настройкой ``SLOW_QUERY_MS``. Обёртка ``execute_wrapper``
+на каждом соединении пишет в лог ``core.querylog`` запросы дольше
+порога вместе с view и строкой кода проекта, откуда запрос пришёл;
+для доли ``SLOW_QUERY_EXPLAIN_RATE`` из них добавляется план
+(``EXPLAIN QUERY PLAN`` в SQLite, ``EXPLAIN`` в PostgreSQL).
+
+``QueryLogMiddleware`` сводит запросы одного HTTP-запроса по форме —
+SQL без значений и длины списков ``IN``. Форма, повторённая не меньше
+``N_PLUS_ONE_THRESHOLD`` раз, попадает в лог как вероятный N+1.
+"""
+import json
+import logging
+import os
+import random
+import re
+import sys
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DatabaseError, NotSupportedError
+
+from . import metrics
+from .metrics import view_name
+
+logger = logging.getLogger(__name__)
+
+# Кадры стека, которые не считаются источником запроса: обёртки
+# запросов и бэкенды core, установленные пакеты.
+INTERNAL = (
+    __file__,
+    metrics.__file__,
+    os.path.join(os.path.dirname(__file__), 'backends', ''),
+    os.sep + 'site-packages' + os.sep,
+)
+
+SHAPES = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(...)'),
+)
+
+SAVEPOINT = 'querylog_explain'
+
+_queries = ContextVar('queries', default=None)
+
+
+def shape(sql):
+    """SQL без значений: запросы, различающиеся только ими, совпадают."""
+    for pattern, replacement in SHAPES:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+
+def origin():
+    """Ближайшая к запросу строка кода проекта."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (filename.startswith(settings.BASE_DIR)
+                and not any(part in filename for part in INTERNAL)):
+            path = os.path.relpath(filename, settings.BASE_DIR)
+            return f'{path}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return None
+
+
+def explain(connection, sql, params):
+    """План запроса отдельным курсором без обёрток; None, если
+    бэкенд не умеет, запрос не SELECT или транзакция уже сорвана.
+
+    Курсор без обёрток отдаёт ошибки драйвера как есть, поэтому
+    ловятся и они. Внутри транзакции план снимается под точкой
+    сохранения: ошибка EXPLAIN в PostgreSQL иначе сорвала бы её.
+    """
+    if (not sql.lstrip().upper().startswith('SELECT')
+            or connection.needs_rollback):
+        return None
+    errors = (DatabaseError, NotSupportedError, connection.Database.Error)
+    try:
+        sql = f'{connection.ops.explain_query_prefix()} {sql}'
+        cursor = connection.create_cursor()
+    except errors:
+        return None
+    try:
+        if connection.get_autocommit() or (
+            not connection.features.uses_savepoints
+        ):
+            return fetch_plan(cursor, sql, params)
+        return fetch_plan_in_savepoint(cursor, sql, params, errors)
+    except errors:
+        return None
+    finally:
+        cursor.close()
+
+
+def fetch_plan(cursor, sql, params):
+    cursor.execute(sql, params)
+    return [' '.join(map(str, row)) for row in cursor.fetchall()]
+
+
+def fetch_plan_in_savepoint(cursor, sql, params, errors):
+    cursor.execute(f'SAVEPOINT {SAVEPOINT}')
+    try:
+        return fetch_plan(cursor, sql, params)
+    except errors:
+        cursor.execute(f'ROLLBACK TO SAVEPOINT {SAVEPOINT}')
+        return None
+    finally:
+        cursor.execute(f'RELEASE SAVEPOINT {SAVEPOINT}')
+
+
+def write(event, **fields):
+    logger.warning(json.dumps({'event': event, **fields}, ensure_ascii=False))
+
+
+class RequestQueries:
+    """Запросы одного HTTP-запроса по формам."""
+
+    def __init__(self, request):
+        self.request = request
+        self.shapes = {}
+
+    def add(self, sql, elapsed):
+        key = shape(sql)
+        if key not in self.shapes:
+            self.shapes[key] = [0, 0.0, origin()]
+        stats = self.shapes[key]
+        stats[0] += 1
+        stats[1] += elapsed
+
+    def report(self):
+        for key, (count, elapsed, frame) in self.shapes.items():
+            if count >= settings.N_PLUS_ONE_THRESHOLD:
+                write(
+                    'n_plus_one', view=view_name(self.request),
+                    path=self.request.path, count=count,
+                    ms=round(elapsed * 1000, 2), frame=frame, sql=key,
+                )
+
+
+def log_query(execute, sql, params, many, context):
+    """Обёртка ``execute_wrapper`` для каждого соединения."""
+    threshold = settings.SLOW_QUERY_MS
+    if threshold is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    succeeded = False
+    try:
+        result = execute(sql, params, many, context)
+        succeeded = True
+        return result
+    finally:
+        elapsed = time.perf_counter() - started
+        queries = _queries.get()
+        if queries is not None:
+            queries.add(sql, elapsed)
+        if elapsed * 1000 >= threshold:
+            # План упавшего запроса не снимается: ошибка должна дойти
+            # до вызывающего кода, а транзакция могла сорваться.
+            log_slow(sql, params, many, context, elapsed, queries,
+                     explainable=succeeded)
+
+
+def log_slow(sql, params, many, context, elapsed, queries,
+             explainable=True):
+    plan = None
+    if (explainable and not many
+            and random.random() < settings.SLOW_QUERY_EXPLAIN_RATE):
+        plan = explain(context['connection'], sql, params)
+    request = queries.request if queries is not None else None
+    write(
+        'slow_query',
+        view=view_name(request) if request is not None else None,
+        path=request.path if request is not None else None,
+        ms=round(elapsed * 1000, 2), frame=origin(), sql=sql, plan=plan,
+    )
+
+
+def instrument_connection(sender, connection, **kwargs):
+    if log_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(log_query)
+
+
+class QueryLogMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if settings.SLOW_QUERY_MS is None:
+            return self.get_response(request)
+        queries = RequestQueries(request)
+        token = _queries.set(queries)
+        try:
+            return self.get_response(request)
+        finally:
+            _queries.reset(token)
+            queries.report()
@@ -0,0 +1,75 @@
+"""Чтение лент с реплик PostgreSQL.
+
+Запись всегда идёт в ``default``. Чтение уходит на реплику только
+внутри view, обёрнутых ``read_replica`` (ленты и страница поста), и
+только если клиент недавно ничего не записывал: ``ReplicaMiddleware``
+после записи ставит cookie на ``REPLICA_STICKY_SECONDS``, и пока она
+есть, пользователь читает с основной базы и видит свой пост, даже
+если реплика отстаёт.
+"""
+import random
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+STICKY_COOKIE = 'use_primary'
+
+_replica = ContextVar('replica', default=None)
+_wrote = ContextVar('wrote', default=False)
+
+
+def read_replica(view):
+    """Чтение во время view — с одной случайной реплики."""
+    @wraps(view)
+    def inner(request, *args, **kwargs):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or STICKY_COOKIE in request.COOKIES:
+            return view(request, *args, **kwargs)
+        token = _replica.set(random.choice(replicas))
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _replica.reset(token)
+    return inner
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replica = _replica.get()
+        # Внутри транзакции читаем то же, что пишем.
+        if replica is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaMiddleware:
+    """Прилипание к основной базе после записи."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _wrote.set(False)
+        try:
+            response = self.get_response(request)
+            if _wrote.get():
+                response.set_cookie(
+                    STICKY_COOKIE, '1',
+                    max_age=settings.REPLICA_STICKY_SECONDS,
+                    httponly=True, samesite='Lax',
+                )
+            return response
+        finally:
+            _wrote.reset(token)
@@ -0,0 +1,371 @@
+import importlib
+import json
+import os
+import tempfile
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DatabaseError, connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.http import HttpResponse
+from django.template import engines
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, override_settings,
+)
+from django.urls import resolve, reverse
+
+from core import metrics, profiler, querylog
+from core.warmup import warm_up
+from core.db import check_connections
+from core.routers import (
+    STICKY_COOKIE, ReplicaMiddleware, ReplicaRouter, read_replica,
+)
+from posts.models import Group, Post
+
+
+class SqlitePragmasTest(TestCase):
+    def pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def file_connection(self, directory):
+        return DatabaseWrapper({
+            **connection.settings_dict,
+            'NAME': os.path.join(directory, 'db.sqlite3'),
+        }, alias='pragmas')
+
+    def test_new_connection_leaves_journal_mode_alone(self):
+        with tempfile.TemporaryDirectory() as directory:
+            wrapper = self.file_connection(directory)
+            try:
+                self.assertEqual(
+                    self.pragma(wrapper, 'journal_mode'), 'delete'
+                )
+                # NORMAL — это 1, MEMORY — 2.
+                self.assertEqual(self.pragma(wrapper, 'synchronous'), 1)
+                self.assertEqual(self.pragma(wrapper, 'temp_store'), 2)
+                self.assertEqual(
+                    self.pragma(wrapper, 'cache_size'), -64 * 1024
+                )
+                self.assertEqual(self.pragma(wrapper, 'busy_timeout'), 5000)
+            finally:
+                wrapper.close()
+
+    def test_migration_switches_file_to_wal(self):
+        migration = importlib.import_module('core.migrations.0001_sqlite_wal')
+        with tempfile.TemporaryDirectory() as directory:
+            wrapper = self.file_connection(directory)
+            try:
+                editor = mock.Mock(connection=wrapper)
+                migration.journal_mode('WAL')(None, editor)
+                wrapper.close()
+                self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'wal')
+            finally:
+                wrapper.close()
+
+
+class HealthCheckTest(TestCase):
+    def check(self, health_checks, usable):
+        connection.ensure_connection()
+        settings_dict = {
+            **connection.settings_dict, 'CONN_HEALTH_CHECKS': health_checks
+        }
+        patch = mock.patch.object
+        with patch(connection, 'settings_dict', settings_dict), \
+                patch(connection, 'is_usable', return_value=usable), \
+                patch(connection, 'close') as close:
+            check_connections()
+        return close
+
+    def test_unusable_connection_is_closed(self):
+        self.check(health_checks=True, usable=False).assert_called_once_with()
+
+    def test_usable_connection_is_kept(self):
+        self.check(health_checks=True, usable=True).assert_not_called()
+
+    def test_checks_can_be_disabled(self):
+        self.check(health_checks=False, usable=False).assert_not_called()
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], REPLICA_STICKY_SECONDS=10)
+class ReplicaRouterTest(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def read_in_view(self, request):
+        @read_replica
+        def view(request):
+            return self.router.db_for_read(Post)
+        return view(request)
+
+    def test_feed_views_read_from_replica(self):
+        self.assertEqual(self.read_in_view(self.factory.get('/')), 'replica')
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_writes_go_to_primary(self):
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+        self.assertFalse(self.router.allow_migrate('replica', 'posts'))
+
+    def test_sticky_cookie_pins_reads_to_primary(self):
+        request = self.factory.get('/')
+        request.COOKIES[STICKY_COOKIE] = '1'
+        self.assertEqual(self.read_in_view(request), 'default')
+
+    def test_write_sets_sticky_cookie(self):
+        def write(request):
+            self.router.db_for_write(Post)
+            return HttpResponse()
+
+        def read(request):
+            self.router.db_for_read(Post)
+            return HttpResponse()
+
+        response = ReplicaMiddleware(write)(self.factory.post('/'))
+        self.assertEqual(response.cookies[STICKY_COOKIE]['max-age'], 10)
+        response = ReplicaMiddleware(read)(self.factory.get('/'))
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+
+class MetricsTest(TestCase):
+    labels = (('view', 'posts:index'),)
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+
+    def delta(self, before, name, labels=labels):
+        after = metrics.registry.snapshot()
+        return after.get((name, labels), 0) - before.get((name, labels), 0)
+
+    def test_request_is_recorded_per_view(self):
+        before = metrics.registry.snapshot()
+        self.client.get(reverse('posts:index'))
+        self.assertEqual(self.delta(before, 'yatube_requests_total'), 1)
+        self.assertGreater(self.delta(before, 'yatube_db_queries_total'), 0)
+        self.assertGreater(
+            self.delta(before, 'yatube_template_render_seconds_total'), 0
+        )
+        self.assertGreater(self.delta(
+            before, 'yatube_cache_misses_total',
+            self.labels + (('cache', 'fragments'),)
+        ), 0)
+        self.assertEqual(self.delta(
+            before, 'yatube_request_duration_seconds_bucket',
+            self.labels + (('le', '+Inf'),)
+        ), 1)
+
+    def test_cache_hits_are_counted(self):
+        self.client.get(reverse('posts:index'))
+        before = metrics.registry.snapshot()
+        self.client.get(reverse('posts:index'))
+        self.assertGreater(self.delta(
+            before, 'yatube_cache_hits_total',
+            self.labels + (('cache', 'fragments'),)
+        ), 0)
+
+    def test_structured_log_line(self):
+        with self.assertLogs('core.metrics', 'INFO') as logs:
+            self.client.get(reverse('posts:index'))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'posts:index')
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['db_queries'], 0)
+
+    def test_endpoint_sums_workers(self):
+        self.client.get(reverse('posts:index'))
+        own = metrics.collect()[('yatube_requests_total', self.labels)]
+        cache = caches['default']
+        cache.set('metrics:worker:other', {
+            ('yatube_requests_total', self.labels): 5
+        })
+        cache.set(metrics.WORKERS_KEY, {metrics.WORKER, 'other'})
+        response = self.client.get(reverse('metrics'))
+        self.assertContains(
+            response,
+            f'yatube_requests_total{{view="posts:index"}} {int(own) + 5}\n'
+        )
+        self.assertContains(
+            response, '# TYPE yatube_request_duration_seconds histogram'
+        )
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_endpoint_requires_token(self):
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 404)
+        response = self.client.get(url, HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+
+
+class QueryLogTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for num in range(6):
+            Group.objects.create(title=f'Группа {num}', slug=f'group-{num}')
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+
+    def events(self, logs, event):
+        records = [json.loads(record.getMessage()) for record in logs.records]
+        return [record for record in records if record['event'] == event]
+
+    def test_shape_ignores_values(self):
+        self.assertEqual(
+            querylog.shape('SELECT * FROM t WHERE id IN (%s, %s) LIMIT 10'),
+            querylog.shape("SELECT * FROM t WHERE id IN (%s) LIMIT 'x'"),
+        )
+
+    @override_settings(SLOW_QUERY_MS=0, SLOW_QUERY_EXPLAIN_RATE=1)
+    def test_slow_queries_are_logged_with_view_and_plan(self):
+        with self.assertLogs('core.querylog', 'WARNING') as logs:
+            self.client.get(reverse('posts:index'))
+        slow = self.events(logs, 'slow_query')
+        self.assertTrue(slow)
+        in_view = [record for record in slow
+                   if record['view'] == 'posts:index']
+        self.assertTrue(any(
+            record['frame'].startswith('posts' + os.sep)
+            for record in in_view
+        ))
+        self.assertTrue(any(record['plan'] for record in in_view))
+
+    @override_settings(SLOW_QUERY_MS=1000)
+    def test_repeated_shape_is_flagged(self):
+        def view(request):
+            for group in Group.objects.all():
+                Post.objects.filter(group=group).exists()
+            return HttpResponse()
+
+        request = RequestFactory().get('/')
+        with self.assertLogs('core.querylog', 'WARNING') as logs:
+            querylog.QueryLogMiddleware(view)(request)
+        [flagged] = self.events(logs, 'n_plus_one')
+        self.assertEqual(flagged['count'], 6)
+        self.assertIn('core' + os.sep + 'tests.py', flagged['frame'])
+        self.assertFalse(self.events(logs, 'slow_query'))
+
+    @override_settings(SLOW_QUERY_MS=0, SLOW_QUERY_EXPLAIN_RATE=1)
+    def test_failed_query_keeps_its_error_and_is_not_explained(self):
+        with self.assertLogs('core.querylog', 'WARNING') as logs, \
+                mock.patch.object(querylog, 'explain') as explain, \
+                self.assertRaises(DatabaseError):
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT * FROM no_such_table')
+        explain.assert_not_called()
+        [slow] = self.events(logs, 'slow_query')
+        self.assertIsNone(slow['plan'])
+
+    def test_explain_swallows_driver_errors(self):
+        connection.ensure_connection()
+        # Курсор без обёрток Django отдаёт sqlite3.ProgrammingError.
+        self.assertIsNone(
+            querylog.explain(connection, 'SELECT %s, %s', [1])
+        )
+        # Транзакция теста цела: запросы после ошибки проходят.
+        self.assertTrue(Group.objects.exists())
+
+    def test_explain_skips_broken_transaction(self):
+        connection.ensure_connection()
+        with mock.patch.object(connection, 'needs_rollback', True), \
+                mock.patch.object(connection, 'create_cursor') as cursor:
+            self.assertIsNone(querylog.explain(
+                connection, 'SELECT 1', []
+            ))
+        cursor.assert_not_called()
+
+    def test_disabled_by_default(self):
+        with self.assertNoLogs('core.querylog', 'WARNING'):
+            self.client.get(reverse('posts:index'))
+
+
+def busy_view(request):
+    deadline = time.perf_counter() + 0.05
+    while time.perf_counter() < deadline:
+        pass
+    return HttpResponse()
+
+
+class ProfilerTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.settings = override_settings(
+            PROFILER_DIR=self.directory.name, PROFILER_TOKEN='secret',
+            PROFILER_INTERVAL=0.001,
+        )
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+
+    def profile(self, **headers):
+        request = RequestFactory().get('/', **headers)
+        request.resolver_match = resolve(reverse('posts:index'))
+        return profiler.ProfilerMiddleware(busy_view)(request)
+
+    def test_header_writes_collapsed_stacks_per_view(self):
+        response = self.profile(HTTP_X_PROFILE='secret')
+        self.assertEqual(response['X-Profile-File'], 'posts_index.collapsed')
+        path = os.path.join(self.directory.name, 'posts_index.collapsed')
+        with open(path, encoding='utf-8') as file:
+            lines = file.read().splitlines()
+        self.assertTrue(lines)
+        stack, count = lines[0].rsplit(' ', 1)
+        self.assertTrue(stack.startswith('core/profiler.py:__call__;'))
+        self.assertGreater(int(count), 0)
+        self.assertTrue(any('core/tests.py:busy_view' in line
+                            for line in lines))
+
+    @override_settings(PROFILER_FORMAT='speedscope')
+    def test_speedscope_file(self):
+        response = self.profile(HTTP_X_PROFILE='secret')
+        path = os.path.join(
+            self.directory.name, 'posts_index', response['X-Profile-File']
+        )
+        with open(path, encoding='utf-8') as file:
+            data = json.load(file)
+        [profile] = data['profiles']
+        self.assertEqual(profile['type'], 'sampled')
+        self.assertEqual(len(profile['samples']), len(profile['weights']))
+        names = {frame['name'] for frame in data['shared']['frames']}
+        self.assertIn('busy_view', names)
+
+    def test_not_profiled_without_token_or_sampling(self):
+        for headers in ({}, {'HTTP_X_PROFILE': 'wrong'}):
+            with self.subTest(headers=headers):
+                response = self.profile(**headers)
+                self.assertFalse(response.has_header('X-Profile-File'))
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+    @override_settings(PROFILER_SAMPLE_RATE=1)
+    def test_sampling_rate(self):
+        response = self.profile()
+        self.assertFalse(response.has_header('X-Profile-File'))
+        self.assertEqual(
+            os.listdir(self.directory.name), ['posts_index.collapsed']
+        )
+
+
+class TemplateWarmUpTest(SimpleTestCase):
+    def test_templates_are_compiled_into_cached_loader(self):
+        names = warm_up()
+        for name in ('base.html', 'posts/index.html',
+                     'posts/includes/paginator.html',
+                     'includes/header.html'):
+            with self.subTest(name=name):
+                self.assertIn(name, names)
+        [loader] = engines.all()[0].engine.template_loaders
+        self.assertIn('posts/includes/switcher.html',
+                      loader.get_template_cache)
+
+    def test_nothing_to_warm_without_cached_loader(self):
+        options = settings.TEMPLATES[0]['OPTIONS']
+        with override_settings(TEMPLATES=[{
+            **settings.TEMPLATES[0],
+            'OPTIONS': {**options, 'loaders': settings.TEMPLATE_LOADERS},
+        }]):
+            self.assertEqual(warm_up(), [])
@@ -1,4 +1,9 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+
+from . import metrics as request_metrics
 
 
 def page_not_found(request, exception):
@@ -21,3 +26,21 @@ def forbidden(request, exception):
     return render(
         request, 'core/403.html', status=403
     )
+
+
+def metrics(request):
+    """Метрики для Prometheus: с токеном ``METRICS_TOKEN`` в заголовке
+    ``Authorization: Bearer``, без токена — только с ``INTERNAL_IPS``."""
+    if settings.METRICS_TOKEN:
+        allowed = constant_time_compare(
+            request.META.get('HTTP_AUTHORIZATION', ''),
+            f'Bearer {settings.METRICS_TOKEN}'
+        )
+    else:
+        allowed = request.META.get('REMOTE_ADDR') in settings.INTERNAL_IPS
+    if not allowed:
+        raise Http404
+    return HttpResponse(
+        request_metrics.render(request_metrics.collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -0,0 +1,38 @@
+"""Прогрев кэша шаблонов при старте воркера.
+
+С ``django.template.loaders.cached.Loader`` шаблон разбирается при
+первом обращении и дальше берётся из памяти процесса. ``warm_up``
+заранее загружает все шаблоны из ``DIRS`` — ``base.html``, страницы
+и их ``{% include %}`` — и первые запросы к воркеру не платят за
+разбор. Без кэширующего загрузчика (``DEBUG``) прогревать нечего.
+"""
+import os
+
+from django.template import engines
+from django.template.backends.django import DjangoTemplates
+from django.template.loaders.cached import Loader as CachedLoader
+
+
+def template_names(directory):
+    for root, _, files in os.walk(directory):
+        for file in sorted(files):
+            if file.endswith('.html'):
+                path = os.path.relpath(os.path.join(root, file), directory)
+                yield path.replace(os.sep, '/')
+
+
+def warm_up():
+    """Загружает шаблоны в кэш; возвращает их имена."""
+    loaded = []
+    for backend in engines.all():
+        if not isinstance(backend, DjangoTemplates):
+            continue
+        engine = backend.engine
+        if not any(isinstance(loader, CachedLoader)
+                   for loader in engine.template_loaders):
+            continue
+        for directory in engine.dirs:
+            for name in template_names(directory):
+                engine.get_template(name)
+                loaded.append(name)
+    return loaded
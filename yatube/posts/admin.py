@@ -2,6 +2,7 @@ from django.contrib import admin
 
 # Register your models here.
 from .models import Follow, Post, Group, Comment
+from .search import search_posts
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -11,6 +12,14 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск через полнотекстовый индекс вместо LIKE '%q%'.
+        if not search_term:
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        return search_posts(queryset, search_term), False
+
 
 admin.site.register(Post, PostAdmin)
 
@@ -0,0 +1,56 @@
+"""Версии областей для кэширования фрагментов шаблонов.
+
+Ключ фрагмента включает номер версии своей области (лента, группа,
+автор, лента подписок пользователя, пост). Сигналы ``posts.signals``
+увеличивают версию при изменении постов, комментариев и подписок, так
+что старые фрагменты просто перестают читаться и TTL может быть большим.
+Из тех же версий ``posts.conditional`` строит ETag страниц.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def version_key(scope):
+    return f'posts:version:{scope}'
+
+
+def initial_version():
+    # Версия от времени, а не 1: после вытеснения ключа из кэша новая
+    # версия не совпадёт с той, под которой лежат старые фрагменты.
+    return int(time.time() * 1000)
+
+
+def get_version(*scopes):
+    """Сводная версия областей для ключа фрагмента."""
+    keys = [version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    missing = {key: initial_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return '.'.join(str(versions[key]) for key in keys)
+
+
+def bump(scopes):
+    for scope in scopes:
+        key = version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, initial_version(), None)
+
+
+def fragment_context(*scopes):
+    """Переменные для ``{% cache cache_ttl ... cache_version
+    using=cache_alias %}``."""
+    return {
+        'cache_alias': settings.FRAGMENT_CACHE,
+        'cache_ttl': settings.FRAGMENT_CACHE_TTL,
+        'cache_version': get_version(*scopes),
+    }
@@ -0,0 +1,98 @@
+"""Условные GET-запросы для лент и страницы поста.
+
+ETag страницы — хэш версий её областей из ``posts.caching``, id
+пользователя (шапка и кнопки зависят от него) и CSRF-cookie: после
+входа токен меняется, и страница с формой не должна остаться у
+браузера со старым токеном. Если клиент или прокси присылает совпадающий
+ETag, view отвечает ``304 Not Modified``, не строя querysets и не
+рендеря шаблон. Last-Modified не отдаётся: с точностью до секунды он
+пропустил бы изменение в ту же секунду.
+"""
+import hashlib
+from functools import wraps
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+from . import caching, counts
+from .feeds import feed_scopes, followed_authors
+from .models import Post, User
+
+
+def validator(request, scopes):
+    """ETag страницы, собранной из областей ``scopes``."""
+    version = caching.get_version(*scopes)
+    # Сырой cookie, а не get_token(): тот пометил бы токен
+    # использованным, и анонимные страницы перестали бы кэшироваться.
+    csrf = request.META.get('CSRF_COOKIE', '')
+    digest = hashlib.md5(
+        f'{request.user.pk or 0}:{csrf}:{version}'.encode()
+    ).hexdigest()
+    return f'W/"{digest}"'
+
+
+def conditional(get_sources):
+    """Декоратор view: ``get_sources(request, *args, **kwargs)``
+    возвращает области страницы или None, если страницы нет и
+    проверять нечего."""
+    def decorator(view):
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            scopes = get_sources(request, *args, **kwargs)
+            if scopes is None:
+                return view(request, *args, **kwargs)
+            etag = validator(request, scopes)
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code == 200:
+                    response['ETag'] = etag
+            # Хранить можно, но перед показом — перепроверять.
+            patch_cache_control(response, no_cache=True)
+            if request.user.is_authenticated:
+                patch_cache_control(response, private=True)
+            return response
+        return inner
+    return decorator
+
+
+def index_sources(request):
+    return [counts.ALL]
+
+
+def group_sources(request, slug):
+    return [counts.group_scope(slug)]
+
+
+def follow_sources(request):
+    user = request.user
+    return feed_scopes(user.pk, followed_authors(user))
+
+
+def profile_sources(request, username):
+    author_id = User.objects.filter(
+        username=username
+    ).values_list('pk', flat=True).first()
+    if author_id is None:
+        return None
+    scopes = [counts.author_scope(author_id)]
+    if request.user.is_authenticated:
+        # Кнопка «подписаться» зависит от подписок читателя.
+        scopes.append(counts.follow_scope(request.user.pk))
+    return scopes
+
+
+def post_sources(request, post_id):
+    post = Post.objects.filter(pk=post_id).values(
+        'author_id', 'group__slug'
+    ).first()
+    if post is None:
+        return None
+    # Страница показывает ещё число постов автора и название группы.
+    scopes = [
+        caching.post_scope(post_id), counts.author_scope(post['author_id'])
+    ]
+    if post['group__slug'] is not None:
+        scopes.append(counts.group_scope(post['group__slug']))
+    return scopes
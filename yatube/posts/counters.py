@@ -0,0 +1,88 @@
+"""Денормализованные счётчики: ``Group.posts_count``,
+``Post.comments_count`` и ``UserStats``.
+
+Сигналы сдвигают их атомарными ``UPDATE ... SET n = n + 1``;
+``recount`` пересчитывает все счётчики одним запросом на поле
+и чинит накопившиеся расхождения.
+"""
+from django.apps import apps as global_apps
+from django.conf import settings
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def shift(queryset, field, delta):
+    """Сдвигает счётчик через ``F()``, не опуская его ниже нуля."""
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    return queryset.update(**{field: F(field) + delta})
+
+
+def shift_user(user_id, field, delta):
+    UserStats = global_apps.get_model('posts', 'UserStats')
+    stats = UserStats.objects.filter(user_id=user_id)
+    if not shift(stats, field, delta) and delta > 0:
+        UserStats.objects.get_or_create(user_id=user_id)
+        shift(stats, field, delta)
+
+
+def counter_specs(apps=global_apps):
+    """(модель, поле-счётчик, считаемая модель, внешний ключ на модель)."""
+    Post = apps.get_model('posts', 'Post')
+    Group = apps.get_model('posts', 'Group')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    UserStats = apps.get_model('posts', 'UserStats')
+    return (
+        (Group, 'posts_count', Post, 'group'),
+        (Post, 'comments_count', Comment, 'post'),
+        (UserStats, 'posts_count', Post, 'author'),
+        (UserStats, 'followers_count', Follow, 'author'),
+        (UserStats, 'following_count', Follow, 'user'),
+    )
+
+
+def actual_count(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total'),
+            output_field=IntegerField()
+        ),
+        0
+    )
+
+
+def create_missing_stats(apps=global_apps):
+    UserStats = apps.get_model('posts', 'UserStats')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    missing = User.objects.filter(stats__isnull=True).values_list(
+        'pk', flat=True
+    ).iterator()
+    UserStats.objects.bulk_create(
+        (UserStats(user_id=user_id) for user_id in missing),
+        batch_size=settings.FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def recount(apps=global_apps, dry_run=False):
+    """Пересчитывает счётчики; возвращает число расхождений по полям."""
+    if not dry_run:
+        create_missing_stats(apps)
+    report = []
+    for model, field, source, foreign_key in counter_specs(apps):
+        actual = actual_count(source, foreign_key)
+        drifted = model.objects.annotate(actual=actual).exclude(
+            **{field: F('actual')}
+        )
+        total = drifted.count()
+        if total and not dry_run:
+            model.objects.filter(
+                pk__in=drifted.values('pk')
+            ).update(**{field: actual})
+        report.append((model, field, total))
+    return report
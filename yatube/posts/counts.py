@@ -0,0 +1,88 @@
+"""Кэшируемые счётчики постов для пагинатора.
+
+Ленты («области») — вся лента, автор, подписки пользователя — хранят
+число постов в кэше. Сигналы из ``posts.signals`` поправляют значения
+при создании и удалении постов, поэтому ``COUNT(*)`` выполняется только
+при промахе кэша. Лента группы берёт ``Group.posts_count``, а её
+область нужна только для версий фрагментов.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+ALL = 'all'
+
+
+def group_scope(slug):
+    return f'group:{slug}'
+
+
+def author_scope(author_id):
+    return f'author:{author_id}'
+
+
+def follow_scope(user_id):
+    return f'follow:{user_id}'
+
+
+def versioned_scope(scope, version):
+    """Область под сводной версией ``caching.get_version``: при смене
+    версии счётчик не сбрасывают, а считают заново под новым ключом.
+    Версия сворачивается в хэш — длина ключа кэша ограничена."""
+    return f'{scope}:{hashlib.md5(version.encode()).hexdigest()}'
+
+
+def cache_key(scope):
+    return f'posts:count:{scope}'
+
+
+def estimate_count(queryset):
+    """Оценка числа строк по статистике СУБД; None, если оценки нет."""
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        return int(plan[0]['Plan']['Plan Rows'])
+    if connection.vendor == 'sqlite' and not queryset.query.where:
+        with connection.cursor() as cursor:
+            try:
+                cursor.execute(
+                    'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1',
+                    [queryset.model._meta.db_table]
+                )
+            except connection.Database.OperationalError:
+                # Таблица статистики появляется только после ANALYZE.
+                return None
+            row = cursor.fetchone()
+        return int(row[0].split()[0]) if row else None
+    return None
+
+
+def get_count(scope, queryset):
+    """Число постов в области: из кэша, оценкой СУБД или ``COUNT(*)``."""
+    key = cache_key(scope)
+    count = cache.get(key)
+    if count is None:
+        if settings.POSTS_COUNT_ESTIMATE:
+            count = estimate_count(queryset)
+        if count is None:
+            count = queryset.count()
+        cache.set(key, count, settings.POSTS_COUNT_TTL)
+    return count
+
+
+def increment(scopes, delta=1):
+    """Сдвигает счётчики; отсутствующие в кэше посчитаются при чтении."""
+    for scope in scopes:
+        try:
+            cache.incr(cache_key(scope), delta)
+        except ValueError:
+            pass
+
+
+def invalidate(scopes):
+    cache.delete_many([cache_key(scope) for scope in scopes])
@@ -0,0 +1,163 @@
+"""Материализованная лента подписок (fan-out on write).
+
+Новый пост сразу раскладывается в ``FeedEntry`` всем подписчикам
+автора, поэтому ``follow_index`` читает готовую ленту прямо
+из ``FeedEntry`` по индексу ``(user, -pub_date, -post)``. Авторы,
+у которых подписчиков больше ``FEED_FANOUT_LIMIT``, не раскладываются:
+их посты подмешиваются при чтении (fan-out on read), а когда автор
+снова опускается до предела, его последние посты дописываются
+в ленты подписчиков.
+"""
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+
+from . import counts
+from .models import FeedEntry, Follow, Post, UserStats
+from .utils import paginate_page
+
+# Порядок записей ленты: совпадает с индексом и с порядком постов
+# (-pub_date, -pk), поэтому курсоры обоих режимов взаимозаменяемы.
+ENTRY_ORDERING = ('-pub_date', '-post_id')
+
+
+def is_fanned_out(author_id):
+    return not UserStats.objects.filter(
+        user_id=author_id,
+        followers_count__gt=settings.FEED_FANOUT_LIMIT
+    ).exists()
+
+
+def fan_out_post(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if not is_fanned_out(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True).iterator()
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+         for user_id in followers),
+        batch_size=settings.FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def materialize(follows):
+    """Раскладывает по подпискам ``follows`` последние
+    ``FEED_BACKFILL_SIZE`` постов их авторов одним ``INSERT ... SELECT``.
+
+    Посты нумеруются внутри автора оконной функцией, поэтому объём
+    не зависит от того, сколько подписок обрабатывается за раз.
+    Популярные авторы пропускаются, уже разложенные записи — тоже.
+    """
+    follows = follows.exclude(
+        author__stats__followers_count__gt=settings.FEED_FANOUT_LIMIT
+    ).order_by().values('user_id', 'author_id')
+    follows_sql, follows_params = follows.query.sql_with_params()
+    connection = connections[FeedEntry.objects.db]
+    ops = connection.ops
+    sql = f"""
+        {ops.insert_statement(ignore_conflicts=True)}
+            {ops.quote_name(FeedEntry._meta.db_table)}
+            (user_id, post_id, pub_date)
+        SELECT follow.user_id, ranked.id, ranked.pub_date
+        FROM ({follows_sql}) follow
+        INNER JOIN (
+            SELECT id, author_id, pub_date, ROW_NUMBER() OVER (
+                PARTITION BY author_id ORDER BY pub_date DESC, id DESC
+            ) AS position
+            FROM {ops.quote_name(Post._meta.db_table)}
+            WHERE author_id IN (SELECT author_id FROM ({follows_sql}) f)
+        ) ranked ON ranked.author_id = follow.author_id
+        WHERE ranked.position <= %s
+        {ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            sql,
+            follows_params + follows_params
+            + (settings.FEED_BACKFILL_SIZE,)
+        )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту последние посты автора после подписки."""
+    materialize(Follow.objects.filter(user_id=user_id, author_id=author_id))
+
+
+def backfill_followers(author_id):
+    """Дописывает посты автора, опустившегося до ``FEED_FANOUT_LIMIT``
+    подписчиков: пока он был выше предела, посты не раскладывались."""
+    materialize(Follow.objects.filter(author_id=author_id))
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты посты автора после отписки."""
+    FeedEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def followed_authors(user):
+    """Подписки ``user``: ``{автор: посты подмешиваются при чтении}``."""
+    follows = Follow.objects.filter(user=user).values_list(
+        'author_id', 'author__stats__followers_count'
+    )
+    return {
+        author_id: (followers or 0) > settings.FEED_FANOUT_LIMIT
+        for author_id, followers in follows
+    }
+
+
+def pulled_authors(followed):
+    return [author_id for author_id, pulled in followed.items() if pulled]
+
+
+def feed_scopes(user_id, followed):
+    """Области ленты подписок: подписки читателя и посты каждого
+    автора. Пост меняет версию одного автора, а не всех его
+    подписчиков."""
+    return [counts.follow_scope(user_id)] + [
+        counts.author_scope(author_id) for author_id in followed
+    ]
+
+
+def follow_feed(user, followed=None):
+    """Посты ленты подписок: материализованные записи плюс посты
+    популярных авторов, которые не раскладывались при публикации."""
+    if followed is None:
+        followed = followed_authors(user)
+    pulled = pulled_authors(followed)
+    if not pulled:
+        return Post.objects.filter(feed_entries__user=user)
+    return Post.objects.filter(
+        Q(pk__in=FeedEntry.objects.filter(user=user).values('post_id'))
+        | Q(author_id__in=pulled)
+    )
+
+
+def follow_page(request, user, followed, scope):
+    """Страница ленты подписок. Без популярных авторов записи читаются
+    из ``FeedEntry`` по индексу и уже потом заменяются постами."""
+    if pulled_authors(followed):
+        return paginate_page(
+            request,
+            follow_feed(user, followed).select_related('author', 'group'),
+            scope=scope,
+        )
+    entries = FeedEntry.objects.filter(user=user).select_related(
+        'post__author', 'post__group'
+    )
+    page = paginate_page(
+        request, entries, ordering=ENTRY_ORDERING, scope=scope
+    )
+    page.object_list = [entry.post for entry in page.object_list]
+    return page
+
+
+def rebuild():
+    """Заново материализует все ленты, например после ``bulk_create``
+    подписок и постов, при котором сигналы не срабатывают."""
+    FeedEntry.objects.all().delete()
+    materialize(Follow.objects.all())
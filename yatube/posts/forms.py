@@ -12,3 +12,9 @@ class CommentForm(forms.ModelForm):
     class Meta:
         model = Comment
         fields = ('text',)
+
+
+class SearchForm(forms.Form):
+    q = forms.CharField(label='Найти', max_length=200, required=False)
+    group = forms.SlugField(label='Группа', required=False)
+    author = forms.CharField(label='Автор', max_length=150, required=False)
@@ -0,0 +1,110 @@
+"""Нормализация загруженных картинок постов.
+
+Файл читается Pillow лениво: для JPEG ``draft`` декодирует сразу
+в уменьшенном масштабе, а ``thumbnail`` уменьшает через ``reduce``,
+поэтому огромное фото не распаковывается в память целиком. Картинка
+поворачивается по EXIF, ужимается до ``POST_IMAGE_MAX_SIZE`` и
+перекодируется без метаданных. Анимация перекодируется покадрово
+с теми же задержками; MPO (JPEG с телефона с дополнительными кадрами
+превью и глубины) анимацией не считается и сохраняется как JPEG.
+"""
+import hashlib
+import os
+from collections import namedtuple
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, ImageSequence
+
+NormalizedImage = namedtuple(
+    'NormalizedImage', ('file', 'width', 'height', 'hash')
+)
+
+EXTENSIONS = {'JPEG': 'jpg'}
+CHUNK_SIZE = 64 * 1024
+
+
+def content_hash(file):
+    """SHA-256 содержимого файла, читаемого кусками."""
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def save_options(format_):
+    options = {}
+    quality = settings.POST_IMAGE_QUALITY.get(format_)
+    if quality is not None:
+        options['quality'] = quality
+    if format_ in ('JPEG', 'PNG'):
+        options['optimize'] = True
+    if format_ == 'JPEG':
+        options['progressive'] = True
+    return options
+
+
+def fit(image, max_size):
+    """Уменьшает кадр и поворачивает его по EXIF."""
+    image.thumbnail((max_size, max_size), Image.LANCZOS, reducing_gap=3.0)
+    image = ImageOps.exif_transpose(image)
+    # Остаток EXIF (геометка, модель камеры) PNG записал бы из info.
+    image.info.pop('exif', None)
+    return image
+
+
+def fit_frames(image, max_size):
+    """Кадры анимации и параметры ``save_all`` для них."""
+    options = {}
+    if 'loop' in image.info:
+        options['loop'] = image.info['loop']
+    frames = []
+    durations = []
+    for frame in ImageSequence.Iterator(image):
+        durations.append(frame.info.get('duration', 0))
+        frames.append(fit(frame.convert('RGBA'), max_size))
+    options.update(
+        save_all=True, append_images=frames[1:], duration=durations
+    )
+    return frames[0], options
+
+
+def normalize(upload):
+    """Возвращает ``NormalizedImage`` с перекодированным файлом."""
+    upload.seek(0)
+    image = Image.open(upload)
+    name = os.path.basename(upload.name)
+    source_format = 'JPEG' if image.format == 'MPO' else image.format
+    animated = source_format != 'JPEG' and getattr(
+        image, 'is_animated', False
+    )
+    if animated:
+        format_ = source_format if source_format in Image.SAVE_ALL else 'GIF'
+    else:
+        format_ = source_format if source_format in Image.SAVE else 'JPEG'
+    if format_ != image.format:
+        extension = EXTENSIONS.get(format_, format_.lower())
+        name = f'{os.path.splitext(name)[0]}.{extension}'
+    max_size = settings.POST_IMAGE_MAX_SIZE
+    if animated:
+        image, options = fit_frames(image, max_size)
+    else:
+        image.draft('RGB', (max_size, max_size))
+        image = fit(image, max_size)
+        options = {}
+    if format_ == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+
+    options.update(save_options(format_))
+    # EXIF отбрасывается, цветовой профиль оставляем, иначе фото
+    # с широким охватом поблекнут.
+    if image.info.get('icc_profile'):
+        options['icc_profile'] = image.info['icc_profile']
+    buffer = BytesIO()
+    image.save(buffer, format=format_, **options)
+    data = ContentFile(buffer.getvalue(), name=name)
+    width, height = image.size
+    return NormalizedImage(data, width, height, content_hash(data))
@@ -0,0 +1,250 @@
+import math
+import time
+from contextlib import ExitStack
+from urllib import error, parse, request as urllib_request
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import F
+from django.http import HttpRequest
+from django.middleware.csrf import get_token
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Group, Post, User
+from posts.urls import app_name, urlpatterns
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values, percent):
+    """Перцентиль по методу ближайшего ранга."""
+    ordered = sorted(values)
+    rank = math.ceil(percent / 100 * len(ordered))
+    return ordered[max(rank, 1) - 1]
+
+
+class ClientTransport:
+    """Тестовый клиент Django: без сети, с подсчётом запросов к базе."""
+
+    counts_queries = True
+
+    def __init__(self):
+        self.clients = {}
+
+    def client(self, user):
+        if user not in self.clients:
+            client = Client()
+            if user is not None:
+                client.force_login(user)
+            self.clients[user] = client
+        return self.clients[user]
+
+    def request(self, method, url, data, user):
+        client = self.client(user)
+        with ExitStack() as stack:
+            contexts = [
+                stack.enter_context(CaptureQueriesContext(connections[alias]))
+                for alias in connections
+            ]
+            started = time.perf_counter()
+            response = getattr(client, method)(url, data)
+            elapsed = time.perf_counter() - started
+        return elapsed, sum(map(len, contexts)), response.status_code
+
+
+class NoRedirect(urllib_request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpTransport:
+    """Запущенный сервер: время включает WSGI-сервер и сеть, запросы
+    к базе отсюда не видны."""
+
+    counts_queries = False
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib_request.build_opener(NoRedirect)
+        self.cookies = {None: ''}
+        request = HttpRequest()
+        self.csrf_token = get_token(request)
+        self.csrf_cookie = request.META['CSRF_COOKIE']
+
+    def cookie(self, user):
+        if user not in self.cookies:
+            # Сессию создаёт тестовый клиент в общей с сервером базе.
+            client = Client()
+            client.force_login(user)
+            session = client.cookies[settings.SESSION_COOKIE_NAME].value
+            self.cookies[user] = (
+                f'{settings.SESSION_COOKIE_NAME}={session}; '
+                f'{settings.CSRF_COOKIE_NAME}={self.csrf_cookie}'
+            )
+        return self.cookies[user]
+
+    def request(self, method, url, data, user):
+        body = None
+        if method == 'post':
+            body = parse.urlencode(
+                {**data, 'csrfmiddlewaretoken': self.csrf_token}
+            ).encode()
+        request = urllib_request.Request(
+            self.base_url + url, data=body,
+            headers={'Cookie': self.cookie(user)},
+        )
+        started = time.perf_counter()
+        try:
+            with self.opener.open(request) as response:
+                response.read()
+                status = response.status
+        except error.HTTPError as response:
+            # Редирект тоже ответ: переходить по нему не нужно.
+            response.read()
+            status = response.code
+        return time.perf_counter() - started, None, status
+
+
+def get_cases(anonymous):
+    """Сценарий на каждое имя из posts/urls.py: метод, адрес,
+    данные формы и от чьего имени."""
+    author = User.objects.order_by(
+        F('stats__posts_count').desc(nulls_last=True)
+    ).first()
+    post = Post.objects.filter(author=author).first()
+    if post is None:
+        raise CommandError('В базе нет постов: запустите seed_benchmark.')
+    reader = User.objects.exclude(pk=author.pk).order_by(
+        F('stats__following_count').desc(nulls_last=True)
+    ).first()
+    if reader is None:
+        raise CommandError('Нужен хотя бы ещё один пользователь.')
+    viewer = None if anonymous else reader
+    post_id = {'post_id': post.pk}
+    username = {'username': author.username}
+    query = parse.urlencode({'q': post.text.split()[0]})
+    cases = {
+        'index': ('get', reverse('posts:index'), None, viewer),
+        'profile': ('get', reverse(
+            'posts:profile', kwargs=username
+        ), None, viewer),
+        'post_detail': ('get', reverse(
+            'posts:post_detail', kwargs=post_id
+        ), None, viewer),
+        'post_edit': ('get', reverse(
+            'posts:post_edit', kwargs=post_id
+        ), None, author),
+        'post_create': ('get', reverse('posts:post_create'), None, author),
+        'add_comment': ('post', reverse(
+            'posts:add_comment', kwargs=post_id
+        ), {'text': 'Комментарий из замера'}, reader),
+        'search': ('get', f'{reverse("posts:search")}?{query}', None,
+                   viewer),
+        'follow_index': ('get', reverse('posts:follow_index'), None,
+                         reader),
+        'profile_follow': ('get', reverse(
+            'posts:profile_follow', kwargs=username
+        ), None, reader),
+        'profile_unfollow': ('get', reverse(
+            'posts:profile_unfollow', kwargs=username
+        ), None, reader),
+    }
+    group = Group.objects.order_by('-posts_count').first()
+    if group is not None:
+        cases['group_list'] = ('get', reverse(
+            'posts:group_list', kwargs={'slug': group.slug}
+        ), None, viewer)
+    # Порядок как в urls.py: подписка идёт перед отпиской, и каждый
+    # проход действительно создаёт и удаляет Follow.
+    return {
+        pattern.name: cases[pattern.name]
+        for pattern in urlpatterns if pattern.name in cases
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагружает каждую страницу из posts/urls.py и показывает '
+        'p50/p95/p99 времени ответа, запросы к базе на страницу и '
+        'пропускную способность. С тестовым клиентом изменения '
+        '(комментарии, подписки) откатываются; с --url остаются в базе.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'names', nargs='*', metavar='URL_NAME',
+            help='Какие страницы мерить; по умолчанию все.'
+        )
+        parser.add_argument(
+            '--requests', type=int, default=50,
+            help='Сколько раз открывать каждую страницу.'
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=1,
+            help='Сколько первых проходов не учитывать.'
+        )
+        parser.add_argument(
+            '--anonymous', action='store_true',
+            help='Открывать публичные страницы без входа.'
+        )
+        parser.add_argument(
+            '--url', metavar='http://127.0.0.1:8000',
+            help='Мерить запущенный сервер вместо тестового клиента.'
+        )
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('--requests должно быть больше нуля.')
+        cases = get_cases(options['anonymous'])
+        names = options['names'] or list(cases)
+        unknown = set(names) - set(cases)
+        if unknown:
+            raise CommandError(f'Нет сценария для {", ".join(unknown)}.')
+        if options['url']:
+            transport = HttpTransport(options['url'])
+            results = self.run(transport, cases, names, options)
+        else:
+            transport = ClientTransport()
+            with transaction.atomic():
+                results = self.run(transport, cases, names, options)
+                transaction.set_rollback(True)
+            # В кэше могли остаться страницы с откаченными данными.
+            for alias in settings.CACHES:
+                caches[alias].clear()
+        self.report(results, transport.counts_queries)
+
+    def run(self, transport, cases, names, options):
+        """Проходы по всем страницам подряд, чтобы изменения
+        (комментарии, подписки) сбрасывали кэш между чтениями."""
+        results = {name: [] for name in names}
+        for iteration in range(options['warmup'] + options['requests']):
+            for name in names:
+                result = transport.request(*cases[name])
+                if iteration >= options['warmup']:
+                    results[name].append(result)
+        return results
+
+    def report(self, results, counts_queries):
+        percentiles = ''.join(f'{f"p{p}, мс":>10}' for p in PERCENTILES)
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'{"страница":<24}{percentiles}{"запросов":>10}'
+            f'{"зап/с":>9}{"ошибок":>8}'
+        ))
+        for name, measured in results.items():
+            times = [elapsed for elapsed, _, _ in measured]
+            timings = ''.join(
+                f'{percentile(times, p) * 1000:10.1f}' for p in PERCENTILES
+            )
+            queries = f'{"—":>10}'
+            if counts_queries:
+                total = sum(count for _, count, _ in measured)
+                queries = f'{total / len(measured):10.1f}'
+            errors = sum(status >= 400 for _, _, status in measured)
+            self.stdout.write(
+                f'{f"{app_name}:{name}":<24}{timings}{queries}'
+                f'{len(times) / sum(times):9.1f}{errors:8}'
+            )
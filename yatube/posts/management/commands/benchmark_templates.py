@@ -0,0 +1,97 @@
+import time
+from copy import copy
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+from django.test.signals import template_rendered
+from django.test.utils import (
+    setup_test_environment, teardown_test_environment,
+)
+
+from .benchmark import ClientTransport, get_cases, percentile
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает время разбора и рендеринга каждого шаблона, '
+        'включая {% include %}, на контекстах настоящих страниц из '
+        'posts/urls.py. Кэш фрагментов на время замера выключен.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat', type=int, default=50,
+            help='Сколько раз разбирать и рендерить каждый шаблон.'
+        )
+        parser.add_argument(
+            '--anonymous', action='store_true',
+            help='Открывать публичные страницы без входа.'
+        )
+
+    def handle(self, *args, **options):
+        dummy = {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+        with override_settings(CACHES={
+            **settings.CACHES, settings.FRAGMENT_CACHE: dummy,
+        }):
+            with transaction.atomic():
+                rendered = self.capture(get_cases(options['anonymous']))
+                transaction.set_rollback(True)
+            rows = [
+                (name, *self.measure(template, context, options['repeat']))
+                for name, (template, context) in rendered.items()
+            ]
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'{"шаблон":<48}{"разбор, мс":>12}{"p50, мс":>10}{"p95, мс":>10}'
+        ))
+        for name, compiled, median, slow in sorted(
+            rows, key=lambda row: row[2], reverse=True
+        ):
+            self.stdout.write(
+                f'{name:<48}{compiled * 1000:12.2f}'
+                f'{median * 1000:10.2f}{slow * 1000:10.2f}'
+            )
+
+    def capture(self, cases):
+        """Шаблон и копия контекста при первом рендеринге каждого
+        шаблона, в том числе вложенных."""
+        rendered = {}
+
+        def store(sender, template, context, **kwargs):
+            if template.name and template.name not in rendered:
+                rendered[template.name] = (template, copy(context))
+
+        # Сигнал template_rendered шлёт только тестовое окружение.
+        try:
+            setup_test_environment()
+        except RuntimeError:
+            own_environment = False
+        else:
+            own_environment = True
+        template_rendered.connect(store)
+        try:
+            transport = ClientTransport()
+            for method, url, data, user in cases.values():
+                if method == 'get':
+                    transport.request(method, url, data, user)
+        finally:
+            template_rendered.disconnect(store)
+            if own_environment:
+                teardown_test_environment()
+        return rendered
+
+    def measure(self, template, context, repeat):
+        compiled = []
+        rendered = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            template.engine.from_string(template.source)
+            compiled.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            template.render(copy(context))
+            rendered.append(time.perf_counter() - started)
+        return (
+            percentile(compiled, 50), percentile(rendered, 50),
+            percentile(rendered, 95),
+        )
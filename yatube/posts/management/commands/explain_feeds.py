@@ -0,0 +1,123 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from posts.feeds import ENTRY_ORDERING
+from posts.models import Comment, FeedEntry, Follow, Post
+from posts.seeding import seed
+from posts.utils import CursorPaginator
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает планы EXPLAIN и время запросов лент без составных '
+        'индексов и с ними.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed', type=int, default=0, metavar='POSTS',
+            help='Сначала добавить столько синтетических постов.'
+        )
+        parser.add_argument(
+            '--depth', type=int, default=10000,
+            help='Глубина «далёкой» страницы для OFFSET и курсора.'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Сколько раз выполнять каждый запрос для медианы.'
+        )
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            posts = options['seed']
+            seed(
+                users=max(2, posts // 100), groups=max(1, posts // 2000),
+                posts=posts, comments=posts, follows=posts // 5,
+                log=self.stdout.write,
+            )
+        queries = self.feed_queries(options['depth'])
+        if not queries:
+            self.stderr.write('В базе нет постов: запустите с --seed.')
+            return
+        for title, with_indexes in (
+            ('Без составных индексов', False), ('С индексами', True)
+        ):
+            self.stdout.write(self.style.MIGRATE_HEADING(title))
+            with transaction.atomic():
+                if not with_indexes:
+                    self.drop_indexes()
+                for name, queryset in queries:
+                    self.report(name, queryset, options['repeat'])
+                transaction.set_rollback(True)
+
+    def feed_queries(self, depth):
+        post = Post.objects.order_by('-pub_date', '-pk').first()
+        if post is None:
+            return []
+        per_page = settings.POSTS_PER_PAGE
+        posts = Post.objects.select_related('author', 'group')
+        paginator = CursorPaginator(posts, per_page)
+        feed = paginator.object_list
+        deep = feed[depth:depth + 1].first() or post
+        commented = Comment.objects.order_by().values_list(
+            'post_id', flat=True
+        ).first() or post.pk
+        reader = Follow.objects.values_list('user_id', flat=True).first()
+        queries = [
+            ('index', feed[:per_page]),
+            ('index OFFSET', feed[depth:depth + per_page]),
+            ('index cursor', feed.filter(
+                paginator.seek([deep.pub_date, deep.pk])
+            )[:per_page]),
+            ('group_list', feed.filter(group_id=post.group_id)[:per_page]),
+            ('profile', feed.filter(author_id=post.author_id)[:per_page]),
+            ('post_detail comments', Comment.objects.filter(
+                post_id=commented
+            ).order_by('-created', '-pk')[:per_page]),
+            ('follow by author', Follow.objects.filter(
+                author_id=post.author_id
+            )),
+        ]
+        if reader is not None:
+            queries.append((
+                'follow_index',
+                FeedEntry.objects.filter(user_id=reader).select_related(
+                    'post__author', 'post__group'
+                ).order_by(*ENTRY_ORDERING)[:per_page]
+            ))
+        return queries
+
+    def drop_indexes(self):
+        # Не через schema_editor: у SQLite он не работает внутри atomic(),
+        # а индексы должны вернуться при откате транзакции.
+        with connection.cursor() as cursor:
+            for model in (Post, Comment):
+                for index in model._meta.indexes:
+                    cursor.execute(
+                        f'DROP INDEX {connection.ops.quote_name(index.name)}'
+                    )
+
+    def report(self, name, queryset, repeat):
+        sql, params = queryset.query.sql_with_params()
+        explain = (
+            'EXPLAIN QUERY PLAN' if connection.vendor == 'sqlite'
+            else 'EXPLAIN'
+        )
+        timings = []
+        with connection.cursor() as cursor:
+            cursor.execute(f'{explain} {sql}', params)
+            plan = [row[-1] for row in cursor.fetchall()]
+            for _ in range(repeat):
+                started = time.perf_counter()
+                cursor.execute(sql, params)
+                cursor.fetchall()
+                timings.append(time.perf_counter() - started)
+        self.stdout.write(
+            f'{name}: медиана {statistics.median(timings) * 1000:.2f} мс'
+        )
+        for line in plan:
+            self.stdout.write(f'    {line}')
@@ -0,0 +1,252 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix, del_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from posts import storage
+from posts.models import ImageBlob, Post
+from posts.utils import batched
+
+DONE = object()
+
+
+def old_file_size(entry, deadline):
+    """Размер файла, изменённого раньше ``deadline``, иначе None."""
+    if not entry.is_file(follow_symlinks=False):
+        return None
+    stat = entry.stat(follow_symlinks=False)
+    return stat.st_size if stat.st_mtime < deadline else None
+
+
+def put(results, stop, item):
+    # Если читатель бросил генератор, поток не должен висеть на put.
+    while not stop.is_set():
+        try:
+            results.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            continue
+
+
+def walk(directory, deadline, results, stop):
+    """Обходит каталог целиком и кладёт найденные файлы в очередь."""
+    try:
+        stack = [directory]
+        while stack and not stop.is_set():
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                        continue
+                    size = old_file_size(entry, deadline)
+                    if size is not None:
+                        put(results, stop, (entry.path, size))
+    finally:
+        put(results, stop, DONE)
+
+
+def scan(root, workers, grace):
+    """Файлы под ``root`` старше ``grace`` секунд: (путь, размер).
+
+    Подкаталоги верхнего уровня обходятся параллельно (у блобов это
+    256 каталогов ``ab/``), очередь ограничена, так что память
+    не зависит от числа файлов.
+    """
+    if not os.path.isdir(root):
+        return
+    deadline = time.time() - grace
+    directories = []
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                directories.append(entry.path)
+                continue
+            size = old_file_size(entry, deadline)
+            if size is not None:
+                yield entry.path, size
+    results = queue.Queue(maxsize=workers * 1000)
+    stop = threading.Event()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for directory in directories:
+            executor.submit(walk, directory, deadline, results, stop)
+        running = len(directories)
+        try:
+            while running:
+                item = results.get()
+                if item is DONE:
+                    running -= 1
+                else:
+                    yield item
+        finally:
+            stop.set()
+
+
+def existing_keys(keys):
+    """Какие из ключей sorl есть в key-value store."""
+    if isinstance(default.kvstore, KVStore):
+        return set(KVStoreModel.objects.filter(
+            key__in=keys
+        ).values_list('key', flat=True))
+    return {key for key in keys if default.kvstore._get_raw(key)}
+
+
+def source_keys(batch_size):
+    """Ключи исходных картинок, у которых в sorl есть миниатюры."""
+    prefix = add_prefix('', identity='thumbnails')
+    if isinstance(default.kvstore, KVStore):
+        keys = KVStoreModel.objects.filter(
+            key__startswith=prefix
+        ).values_list('key', flat=True).iterator(chunk_size=batch_size)
+        return (del_prefix(key) for key in keys)
+    return default.kvstore._find_keys(identity='thumbnails')
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет картинки постов, миниатюры и записи sorl-thumbnail, '
+        'на которые больше нет ссылок.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что было бы удалено.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько файлов проверять и удалять за раз.'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Число потоков, обходящих каталоги.'
+        )
+        parser.add_argument(
+            '--grace', type=int, default=60 * 60,
+            help='Не трогать файлы моложе стольких секунд: пост с только '
+                 'что загруженной картинкой мог ещё не сохраниться.'
+        )
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.batch_size = options['batch_size']
+        self.verbosity = options['verbosity']
+        self.collect_blobs()
+        self.clean_kvstore()
+        self.sweep(
+            'Картинки', storage.post_images,
+            Post._meta.get_field('image').upload_to,
+            self.unreferenced_images, self.delete_images, options
+        )
+        self.sweep(
+            'Миниатюры', default.storage, thumbnail_settings.THUMBNAIL_PREFIX,
+            self.unreferenced_thumbnails, self.delete_thumbnails, options
+        )
+
+    def collect_blobs(self):
+        """Блобы, счётчик ссылок которых уже обнулился."""
+        names = ImageBlob.objects.filter(refcount=0).values_list(
+            'name', flat=True
+        ).iterator(chunk_size=self.batch_size)
+        total = 0
+        for name in names:
+            total += self.dry_run or storage.collect(name)
+        self.stdout.write(f'Блобы без ссылок: {total}')
+
+    def clean_kvstore(self):
+        """Записи sorl об исходниках, которых нет ни у одного поста."""
+        # Имя не важно: нужен только путь к классу хранилища.
+        post_storage = ImageFile(
+            'posts', storage.post_images
+        ).serialize_storage()
+        checked = stale = 0
+        for keys in batched(source_keys(self.batch_size), self.batch_size):
+            sources = [default.kvstore._get(key) for key in keys]
+            sources = [source for source in sources if source is not None]
+            referenced = set(Post.objects.filter(
+                image__in=[source.name for source in sources]
+            ).values_list('image', flat=True))
+            checked += len(keys)
+            for source in sources:
+                if (source.name in referenced
+                        and source.serialize_storage() == post_storage):
+                    continue
+                stale += 1
+                self.log_name(source.name)
+                if not self.dry_run:
+                    default.kvstore.delete(source)
+        self.stdout.write(
+            f'Записи sorl: проверено {checked}, устаревших {stale}'
+        )
+
+    def sweep(self, label, file_storage, prefix, find, delete, options):
+        root = file_storage.path(prefix)
+        files = scan(root, options['workers'], options['grace'])
+        scanned = orphaned = size = 0
+        for batch in batched(files, self.batch_size):
+            sizes = {
+                os.path.relpath(path, file_storage.location).replace(
+                    os.sep, '/'
+                ): file_size
+                for path, file_size in batch
+            }
+            orphans = find(list(sizes))
+            if orphans and not self.dry_run:
+                orphans = delete(orphans)
+            scanned += len(batch)
+            orphaned += len(orphans)
+            size += sum(sizes[name] for name in orphans)
+            for name in orphans:
+                self.log_name(name)
+        action = 'можно удалить' if self.dry_run else 'удалено'
+        self.stdout.write(
+            f'{label}: просмотрено {scanned}, {action} {orphaned} '
+            f'({size} байт)'
+        )
+
+    def unreferenced_images(self, names):
+        referenced = set(Post.objects.filter(
+            image__in=names
+        ).values_list('image', flat=True))
+        # Ссылку может держать и загрузка, пост которой ещё не сохранён.
+        referenced.update(ImageBlob.objects.filter(
+            name__in=names, refcount__gt=0
+        ).values_list('name', flat=True))
+        return [name for name in names if name not in referenced]
+
+    def delete_images(self, names):
+        """Удаляет только через ``storage.collect``: он перепроверяет
+        счётчик под блокировкой, и загрузка того же содержимого между
+        поиском и удалением файл не потеряет. Файлу без блоба сначала
+        заводится блоб без ссылок, чтобы было что блокировать."""
+        deleted = []
+        for name in names:
+            ImageBlob.objects.get_or_create(name=name)
+            if storage.collect(name):
+                deleted.append(name)
+        return deleted
+
+    def unreferenced_thumbnails(self, names):
+        keys = {
+            add_prefix(ImageFile(name, default.storage).key): name
+            for name in names
+        }
+        known = existing_keys(list(keys))
+        return [name for key, name in keys.items() if key not in known]
+
+    def delete_thumbnails(self, names):
+        for name in names:
+            default.storage.delete(name)
+        return names
+
+    def log_name(self, name):
+        if self.verbosity > 1:
+            self.stdout.write(f'  {name}')
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import recount
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики и чинит расхождения.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать число расхождений, ничего не меняя.'
+        )
+
+    def handle(self, *args, **options):
+        for model, field, drifted in recount(dry_run=options['dry_run']):
+            self.stdout.write(
+                f'{model._meta.label}.{field}: расхождений {drifted}'
+            )
@@ -0,0 +1,65 @@
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.seeding import seed
+
+
+class Command(BaseCommand):
+    help = (
+        'Наполняет базу синтетическими пользователями, группами, постами, '
+        'комментариями и подписками с перекосом популярности для '
+        'замеров командой benchmark.'
+    )
+
+    def add_arguments(self, parser):
+        for name, default in (
+            ('users', 1000), ('groups', 50), ('posts', 100000),
+            ('comments', 100000), ('follows', 20000),
+        ):
+            parser.add_argument(
+                f'--{name}', type=int, default=default,
+                help=f'Сколько создать (по умолчанию {default}).'
+            )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько последних дней раскидать даты.'
+        )
+        parser.add_argument(
+            '--skew', type=float, default=1.1,
+            help='Показатель закона Ципфа; 0 — равномерно.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Сколько строк вставлять за раз.'
+        )
+        parser.add_argument(
+            '--random-seed', type=int,
+            help='Зерно генератора для воспроизводимого набора.'
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 2 and (options['posts'] or options['follows']):
+            raise CommandError('Нужно хотя бы два пользователя.')
+        if options['comments'] and not options['posts']:
+            raise CommandError('Комментариям нужны посты.')
+        if options['skew'] < 0:
+            raise CommandError('--skew не может быть отрицательным.')
+        log = self.stdout.write if options['verbosity'] > 1 else None
+        started = time.monotonic()
+        seed(
+            users=options['users'], groups=options['groups'],
+            posts=options['posts'], comments=options['comments'],
+            follows=options['follows'], days=options['days'],
+            batch_size=options['batch_size'], log=log,
+            rng=random.Random(options['random_seed']), skew=options['skew'],
+        )
+        # Версии кэша при bulk_create не менялись.
+        for alias in settings.CACHES:
+            caches[alias].clear()
+        self.stdout.write(
+            f'Готово за {time.monotonic() - started:.1f} с.'
+        )
@@ -0,0 +1,91 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Group, Post, User
+
+ENGINES = (
+    'django.contrib.sessions.backends.db',
+    'django.contrib.sessions.backends.cached_db',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает, сколько запросов к базе (и из них к django_session) '
+        'делает страница для анонима и для вошедшего пользователя с '
+        'сессиями в базе и в кэше.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='Кем входить; по умолчанию автор последнего поста.'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Сколько раз открывать каждую страницу.'
+        )
+
+    def handle(self, *args, **options):
+        post = Post.objects.select_related('author', 'group').first()
+        if post is None:
+            raise CommandError(
+                'В базе нет постов: запустите explain_feeds --seed.'
+            )
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f'Нет пользователя {options["user"]}.')
+        else:
+            user = post.author
+        urls = self.get_urls(post, user)
+        for engine in ENGINES:
+            self.stdout.write(self.style.MIGRATE_HEADING(engine))
+            with override_settings(SESSION_ENGINE=engine):
+                for title, login in (('аноним', False), (user.username, True)):
+                    self.report(title, login and user, urls, options['repeat'])
+
+    def get_urls(self, post, user):
+        group = post.group or Group.objects.first()
+        urls = {
+            'index': reverse('posts:index'),
+            'profile': reverse(
+                'posts:profile', kwargs={'username': user.username}
+            ),
+            'post_detail': reverse(
+                'posts:post_detail', kwargs={'post_id': post.pk}
+            ),
+            'follow_index': reverse('posts:follow_index'),
+        }
+        if group is not None:
+            urls['group_list'] = reverse(
+                'posts:group_list', kwargs={'slug': group.slug}
+            )
+        return urls
+
+    def report(self, title, user, urls, repeat):
+        # Новый клиент — новый обработчик: SessionMiddleware берёт
+        # движок сессий из настроек при создании.
+        client = Client()
+        if user:
+            client.force_login(user)
+        for name, url in urls.items():
+            queries = sessions = 0
+            for _ in range(repeat):
+                with CaptureQueriesContext(connection) as context:
+                    client.get(url)
+                queries += len(context)
+                sessions += sum(
+                    'django_session' in query['sql']
+                    for query in context.captured_queries
+                )
+            self.stdout.write(
+                f'{title:>12} {name:<14} запросов {queries / repeat:5.1f}, '
+                f'к сессиям {sessions / repeat:4.1f}'
+            )
+        created = 'да' if 'sessionid' in client.cookies else 'нет'
+        self.stdout.write(f'{title:>12} есть сессия: {created}')
+        client.logout()
@@ -0,0 +1,66 @@
+from django.db import migrations
+
+# SQL скопирован из posts.search на момент миграции: бэкенды поиска
+# могут меняться, а миграция должна делать то же, что и раньше.
+# Свой POSTS_SEARCH_BACKEND ставит индекс своей миграцией.
+FTS_TABLE = 'posts_post_fts'
+
+INSTALL_SQL = {
+    'sqlite': (
+        f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+            title, text, content='posts_post', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )""",
+        f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT
+            ON posts_post BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, title, text)
+            VALUES (new.id, new.title, new.text);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE
+            ON posts_post BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, text)
+            VALUES ('delete', old.id, old.title, old.text);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au
+            AFTER UPDATE OF title, text ON posts_post BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, text)
+            VALUES ('delete', old.id, old.title, old.text);
+            INSERT INTO {FTS_TABLE}(rowid, title, text)
+            VALUES (new.id, new.title, new.text);
+        END""",
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+    ),
+    'postgresql': (
+        "CREATE INDEX posts_post_search_idx ON posts_post USING gin (("
+        "to_tsvector('russian', "
+        "coalesce(posts_post.title, '') || ' ' || posts_post.text)))",
+    ),
+}
+
+UNINSTALL_SQL = {
+    'sqlite': (
+        f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ai',
+        f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ad',
+        f'DROP TRIGGER IF EXISTS {FTS_TABLE}_au',
+        f'DROP TABLE IF EXISTS {FTS_TABLE}',
+    ),
+    'postgresql': ('DROP INDEX IF EXISTS posts_post_search_idx',),
+}
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        for sql in statements.get(schema_editor.connection.vendor, ()):
+            schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(INSTALL_SQL), run(UNINSTALL_SQL)),
+    ]
@@ -3,6 +3,9 @@ from django.db import models
 # Create your models here.
 from django.contrib.auth import get_user_model
 
+from .images import normalize
+from .storage import post_images
+
 # Автоматически создаём таблицу для пользователя
 User = get_user_model()
 
@@ -18,6 +21,9 @@ class Group(models.Model):
         verbose_name='Описание группы',
         help_text='Опишите вашу группу'
     )
+    posts_count = models.PositiveIntegerField(
+        'Число постов', default=0, editable=False
+    )
 
     class Meta:
         verbose_name = 'Группа'
@@ -61,16 +67,57 @@ class Post(models.Model):
         verbose_name='Картинка',
         help_text='Загрузите картинку к посту',
         upload_to='posts/',
+        storage=post_images,
         blank=True
     )
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки', null=True, blank=True, editable=False
+    )
+    image_height = models.PositiveIntegerField(
+        'Высота картинки', null=True, blank=True, editable=False
+    )
+    image_hash = models.CharField(
+        'SHA-256 картинки', max_length=64, blank=True, editable=False
+    )
+    comments_count = models.PositiveIntegerField(
+        'Число комментариев', default=0, editable=False
+    )
 
     def __str__(self) -> str:
         return self.title
 
+    def save(self, *args, **kwargs):
+        # Новую загрузку нормализуем до того, как FileField её сохранит.
+        if self.image and not self.image._committed:
+            normalized = normalize(self.image.file)
+            self.image = normalized.file
+            self.image_width = normalized.width
+            self.image_height = normalized.height
+            self.image_hash = normalized.hash
+        elif not self.image:
+            self.image_width = self.image_height = None
+            self.image_hash = ''
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        # Совпадают с ключом keyset-пагинации (-pub_date, -id)
+        # в общей ленте, ленте группы и профиле.
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'], name='post_pub_date_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx'
+            ),
+        ]
 
 
 class Comment(models.Model):
@@ -97,6 +144,12 @@ class Comment(models.Model):
         ordering = ('-created',)
         verbose_name = 'Комментарий',
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(
+                fields=['post', '-created', '-id'],
+                name='comment_post_created_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -128,3 +181,81 @@ class Follow(models.Model):
 
     def __str__(self):
         return self.author.username
+
+
+class UserStats(models.Model):
+    """Денормализованные счётчики пользователя.
+
+    Поддерживаются сигналами ``posts.signals`` через ``F()``;
+    расхождения исправляет команда ``manage.py recount_counters``.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField('Число постов', default=0)
+    followers_count = models.PositiveIntegerField(
+        'Число подписчиков', default=0
+    )
+    following_count = models.PositiveIntegerField(
+        'Число подписок', default=0
+    )
+
+    class Meta:
+        verbose_name = 'Статистика пользователя'
+        verbose_name_plural = 'Статистика пользователей'
+
+    def __str__(self):
+        return str(self.user)
+
+
+class FeedEntry(models.Model):
+    """Запись материализованной ленты подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Читатель',
+    )
+    post = models.ForeignKey(
+        'Post',
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пост',
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        ordering = ('-pub_date',)
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_feed_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='feed_user_pub_date_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user} ← {self.post}'
+
+
+class ImageBlob(models.Model):
+    """Файл картинки в хранилище и число постов, которые на него ссылаются."""
+    name = models.CharField('Имя файла', max_length=100, primary_key=True)
+    refcount = models.PositiveIntegerField('Число ссылок', default=0)
+
+    class Meta:
+        verbose_name = 'Файл картинки'
+        verbose_name_plural = 'Файлы картинок'
+
+    def __str__(self):
+        return f'{self.name} ({self.refcount})'
@@ -0,0 +1,88 @@
+"""Кэш целых страниц для анонимных посетителей.
+
+View помечает страницу суррогатными ключами — областями
+``posts.caching`` (вся лента, группа, автор, пост) — через ``tag``.
+Вместе с ответом в кэше хранится сводная версия этих ключей; сигналы
+увеличивают версии при изменении постов, комментариев и групп, и при
+чтении устаревшая страница просто не совпадает по версии. Так
+сбрасываются ровно затронутые страницы, а TTL может быть большим.
+Ключи отдаются и в заголовке ``Surrogate-Key`` для CDN.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import get_conditional_response
+
+from . import caching, counts
+
+
+def page_key(request):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'posts:page:{path}'
+
+
+def tag(request, *keys):
+    """Добавляет суррогатные ключи к странице текущего запроса."""
+    if not hasattr(request, 'surrogate_keys'):
+        request.surrogate_keys = set()
+    request.surrogate_keys.update(keys)
+
+
+def post_keys(posts):
+    """Ключи карточек постов: сам пост и его группа (её название
+    выводится в карточке). Автора помечают только профиль и страница
+    поста, где видна его статистика."""
+    keys = set()
+    for post in posts:
+        keys.add(caching.post_scope(post.pk))
+        if post.group_id is not None:
+            keys.add(counts.group_scope(post.group.slug))
+    return keys
+
+
+def cacheable(request, response):
+    return (
+        request.method == 'GET'
+        and response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        # Страница с CSRF-токеном у каждого своя.
+        and not request.META.get('CSRF_COOKIE_USED')
+        and getattr(request, 'surrogate_keys', None)
+    )
+
+
+def not_modified(request, response):
+    """Условный GET к странице из кэша по её сохранённому ETag."""
+    return get_conditional_response(
+        request, etag=response.get('ETag'), response=response
+    )
+
+
+def anonymous_page_cache(view):
+    """Отдаёт анонимам страницу из кэша, пока не сменилась версия
+    хотя бы одного её суррогатного ключа."""
+    @wraps(view)
+    def inner(request, *args, **kwargs):
+        if (request.method not in ('GET', 'HEAD')
+                or request.user.is_authenticated):
+            return view(request, *args, **kwargs)
+        cache = caches[settings.FRAGMENT_CACHE]
+        key = page_key(request)
+        entry = cache.get(key)
+        if entry is not None:
+            keys, version, response = entry
+            if caching.get_version(*keys) == version:
+                return not_modified(request, response)
+        response = view(request, *args, **kwargs)
+        if cacheable(request, response):
+            keys = sorted(request.surrogate_keys)
+            response['Surrogate-Key'] = ' '.join(keys)
+            cache.set(
+                key, (keys, caching.get_version(*keys), response),
+                settings.PAGE_CACHE_TTL
+            )
+        return response
+    return inner
@@ -0,0 +1,205 @@
+"""Полнотекстовый поиск по постам.
+
+Бэкенд выбирается по СУБД: на SQLite — внешняя FTS5-таблица
+``posts_post_fts``, которую синхронизируют триггеры, на PostgreSQL —
+GIN-индекс по ``to_tsvector``. Другой бэкенд можно указать в
+``POSTS_SEARCH_BACKEND``. Все бэкенды добавляют к постам аннотацию
+``search_rank`` (больше — релевантнее), по которой работает
+keyset-пагинация ``RANK_ORDERING``.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+RANK_ORDERING = ('-search_rank', '-pk')
+WORD_RE = re.compile(r'\w+')
+
+
+def words(query):
+    return WORD_RE.findall(query.lower())
+
+
+def nothing(queryset):
+    """Пустой результат с той же аннотацией, что и у найденного."""
+    return queryset.annotate(
+        search_rank=Value(0.0, output_field=FloatField())
+    ).none()
+
+
+class LikeSearch:
+    """Запасной вариант без индекса: все слова через ``icontains``."""
+
+    def install(self, schema_editor):
+        pass
+
+    def uninstall(self, schema_editor):
+        pass
+
+    def repair(self, connection):
+        pass
+
+    def search(self, queryset, query):
+        condition = Q()
+        for word in words(query):
+            condition &= Q(title__icontains=word) | Q(text__icontains=word)
+        return queryset.filter(condition).annotate(
+            search_rank=Value(0.0, output_field=FloatField())
+        )
+
+
+class SqliteFTSSearch:
+    """Внешняя FTS5-таблица: хранит только инвертированный индекс,
+    текст читается из ``posts_post``.
+
+    SQLite при ``AddField`` и других изменениях пересоздаёт таблицу
+    ``posts_post`` и теряет её триггеры, поэтому после каждой миграции
+    ``repair`` восстанавливает их.
+    """
+
+    table = 'posts_post_fts'
+    table_sql = (
+        f"""CREATE VIRTUAL TABLE {table} USING fts5(
+            title, text, content='posts_post', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )"""
+    )
+    trigger_sql = (
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_ai AFTER INSERT
+            ON posts_post BEGIN
+            INSERT INTO {table}(rowid, title, text)
+            VALUES (new.id, new.title, new.text);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_ad AFTER DELETE
+            ON posts_post BEGIN
+            INSERT INTO {table}({table}, rowid, title, text)
+            VALUES ('delete', old.id, old.title, old.text);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_au
+            AFTER UPDATE OF title, text ON posts_post BEGIN
+            INSERT INTO {table}({table}, rowid, title, text)
+            VALUES ('delete', old.id, old.title, old.text);
+            INSERT INTO {table}(rowid, title, text)
+            VALUES (new.id, new.title, new.text);
+        END""",
+    )
+    rebuild_sql = f"INSERT INTO {table}({table}) VALUES ('rebuild')"
+    uninstall_sql = (
+        f'DROP TRIGGER IF EXISTS {table}_ai',
+        f'DROP TRIGGER IF EXISTS {table}_ad',
+        f'DROP TRIGGER IF EXISTS {table}_au',
+        f'DROP TABLE IF EXISTS {table}',
+    )
+
+    def install(self, schema_editor):
+        schema_editor.execute(self.table_sql)
+        for sql in self.trigger_sql:
+            schema_editor.execute(sql)
+        schema_editor.execute(self.rebuild_sql)
+
+    def uninstall(self, schema_editor):
+        for sql in self.uninstall_sql:
+            schema_editor.execute(sql)
+
+    def repair(self, connection):
+        """Создаёт потерянные триггеры и перестраивает индекс: строки
+        могли поменяться, пока триггеров не было."""
+        if self.table not in connection.introspection.table_names():
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' "
+                "AND tbl_name = 'posts_post' AND name LIKE %s",
+                [f'{self.table}_%']
+            )
+            if cursor.fetchone()[0] == len(self.trigger_sql):
+                return
+            for sql in self.trigger_sql:
+                cursor.execute(sql)
+            cursor.execute(self.rebuild_sql)
+
+    @staticmethod
+    def match(query):
+        # Каждое слово в кавычках: пользовательский ввод не должен
+        # разбираться как синтаксис FTS5 (OR, NEAR, *, скобки).
+        return ' '.join('"{}"'.format(word) for word in words(query))
+
+    def search(self, queryset, query):
+        match = self.match(query)
+        if not match:
+            return nothing(queryset)
+        table = self.table
+        return queryset.extra(where=[
+            f'posts_post.id IN (SELECT rowid FROM {table} '
+            f'WHERE {table} MATCH %s)'
+        ], params=[match]).annotate(search_rank=RawSQL(
+            # bm25 тем меньше, чем релевантнее, поэтому со знаком минус.
+            f'SELECT -bm25({table}) FROM {table} '
+            f'WHERE {table} MATCH %s AND rowid = posts_post.id',
+            [match], output_field=FloatField()
+        ))
+
+
+class PostgresSearch:
+    """``tsvector`` по заголовку и тексту с GIN-индексом по выражению."""
+
+    config = 'russian'
+    index = 'posts_post_search_idx'
+    vector = (
+        "to_tsvector('{config}', "
+        "coalesce(posts_post.title, '') || ' ' || posts_post.text)"
+    )
+
+    def get_vector(self):
+        return self.vector.format(config=self.config)
+
+    def install(self, schema_editor):
+        schema_editor.execute(
+            f'CREATE INDEX {self.index} ON posts_post '
+            f'USING gin (({self.get_vector()}))'
+        )
+
+    def uninstall(self, schema_editor):
+        schema_editor.execute(f'DROP INDEX IF EXISTS {self.index}')
+
+    def repair(self, connection):
+        pass
+
+    def search(self, queryset, query):
+        if not words(query):
+            return nothing(queryset)
+        vector = self.get_vector()
+        tsquery = f"plainto_tsquery('{self.config}', %s)"
+        return queryset.extra(
+            where=[f'{vector} @@ {tsquery}'], params=[query]
+        ).annotate(search_rank=RawSQL(
+            f'ts_rank({vector}, {tsquery})', [query],
+            output_field=FloatField()
+        ))
+
+
+BACKENDS = {
+    'sqlite': SqliteFTSSearch,
+    'postgresql': PostgresSearch,
+}
+
+
+def get_backend(vendor=None):
+    path = getattr(settings, 'POSTS_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    return BACKENDS.get(vendor or connection.vendor, LikeSearch)()
+
+
+def repair(using, **kwargs):
+    """Обработчик ``post_migrate``: восстанавливает триггеры индекса."""
+    db = connections[using]
+    get_backend(db.vendor).repair(db)
+
+
+def search_posts(queryset, query):
+    """Посты, подходящие под запрос, с аннотацией ``search_rank``."""
+    return get_backend().search(queryset, query)
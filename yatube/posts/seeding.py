@@ -0,0 +1,181 @@
+"""Быстрое наполнение базы синтетическими данными для замеров.
+
+Строки вставляются через ``bulk_create`` пачками, сигналы не
+срабатывают, поэтому после вставки пересчитываются денормализованные
+счётчики и материализованные ленты.
+
+Пользователей и группы собирает mixer (``commit=False``, без записи
+в базу), тексты постов и комментариев берутся из пула, который пишет
+Faker из mixer: mixer тратит около миллисекунды на объект, и на сотнях
+тысяч постов генерация заняла бы больше, чем сама вставка. При
+``skew > 0`` авторы, группы, обсуждаемые посты и подписки распределены
+по закону Ципфа: немного популярных объектов и длинный хвост, как
+на живом сайте.
+"""
+import itertools
+import random
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+from mixer.backend.django import Mixer
+
+from . import counters, feeds
+from .models import Comment, Follow, Group, Post, User
+from .utils import batched
+
+TEXT_POOL = 1000
+
+
+@contextmanager
+def manual_dates(*fields):
+    """Временно отключает ``auto_now`` и ``auto_now_add``, чтобы задать
+    даты самим."""
+    previous = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, previous):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def insert(model, objects, batch_size, log=None):
+    total = 0
+    for batch in batched(objects, batch_size):
+        # Размер одного INSERT выбирает бэкенд: у SQLite есть предел
+        # на число строк в составном запросе.
+        model.objects.bulk_create(batch)
+        total += len(batch)
+        if log:
+            log(f'{model._meta.label}: {total}')
+    return total
+
+
+def popularity(ids, skew, rng):
+    """Перемешанные ``ids`` и накопленные веса для ``rng.choices``:
+    вес k-го по популярности объекта пропорционален ``1 / k ** skew``."""
+    ids = list(ids)
+    rng.shuffle(ids)
+    weights = (1 / rank ** skew for rank in range(1, len(ids) + 1))
+    return ids, list(itertools.accumulate(weights))
+
+
+def pick(rng, population, count):
+    ids, cum_weights = population
+    return rng.choices(ids, cum_weights=cum_weights, k=count)
+
+
+def follow_pairs(rng, user_ids, authors, follows):
+    """Подписки: читатели равновероятны, авторы — по популярности."""
+    limit = min(follows, len(user_ids) * (len(user_ids) - 1))
+    pairs = set()
+    # При сильном перекосе уникальных пар может не хватить.
+    for _ in range(20):
+        missing = limit - len(pairs)
+        if not missing:
+            break
+        pairs.update(
+            (user_id, author_id)
+            for user_id, author_id in zip(
+                rng.choices(user_ids, k=missing),
+                pick(rng, authors, missing),
+            )
+            if user_id != author_id
+        )
+    return itertools.islice(pairs, limit)
+
+
+def seed(users=1000, groups=50, posts=100000, comments=100000,
+         follows=20000, days=365, batch_size=5000, log=None, rng=None,
+         skew=0.0):
+    """Создаёт пользователей, группы, посты, комментарии и подписки."""
+    rng = rng or random.Random()
+    prefix = uuid.uuid4().hex[:8]
+    password = make_password(None)
+    now = timezone.now()
+    span = days * 24 * 60 * 60
+    mixer = Mixer(commit=False, locale='ru_RU')
+    fake = mixer.faker
+    fake.seed_instance(rng.random())
+    texts = [
+        fake.paragraph(nb_sentences=rng.randint(1, 8))
+        for _ in range(min(max(posts, comments), TEXT_POOL))
+    ]
+    titles = [
+        fake.sentence(nb_words=4)[:200] for _ in range(len(texts))
+    ]
+
+    def random_date():
+        return now - timedelta(seconds=rng.randrange(span))
+
+    with transaction.atomic():
+        insert(User, (
+            mixer.blend(
+                User, username=f'bench_{prefix}_{num}', password=password,
+                first_name=fake.first_name(), last_name=fake.last_name(),
+            )
+            for num in range(users)
+        ), batch_size, log)
+        insert(Group, (
+            mixer.blend(
+                Group,
+                title=f'{fake.word().capitalize()} {prefix} {num}',
+                slug=f'bench-{prefix}-{num}',
+                description=fake.sentence(),
+            )
+            for num in range(groups)
+        ), batch_size, log)
+        user_ids = list(User.objects.filter(
+            username__startswith=f'bench_{prefix}_'
+        ).order_by().values_list('pk', flat=True))
+        group_ids = list(Group.objects.filter(
+            slug__startswith=f'bench-{prefix}-'
+        ).values_list('pk', flat=True)) + [None]
+        authors = popularity(user_ids, skew, rng)
+
+        pub_date = Post._meta.get_field('pub_date')
+        created = Comment._meta.get_field('created')
+        with manual_dates(pub_date, created):
+            insert(Post, (
+                Post(
+                    title=rng.choice(titles),
+                    text=rng.choice(texts),
+                    author_id=author_id,
+                    group_id=group_id,
+                    pub_date=random_date(),
+                )
+                for author_id, group_id in zip(
+                    pick(rng, authors, posts),
+                    pick(rng, popularity(group_ids, skew, rng), posts),
+                )
+            ), batch_size, log)
+            post_ids = Post.objects.filter(
+                author__username__startswith=f'bench_{prefix}_'
+            ).order_by().values_list('pk', flat=True)
+            insert(Comment, (
+                Comment(
+                    post_id=post_id,
+                    author_id=author_id,
+                    text=rng.choice(texts),
+                    created=random_date(),
+                )
+                for post_id, author_id in zip(
+                    pick(rng, popularity(post_ids, skew, rng), comments),
+                    rng.choices(user_ids, k=comments),
+                )
+            ), batch_size, log)
+
+        insert(Follow, (
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id, author_id in follow_pairs(
+                rng, user_ids, authors, follows
+            )
+        ), batch_size, log)
+
+        counters.recount()
+        feeds.rebuild()
@@ -0,0 +1,204 @@
+from collections import namedtuple
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import caching, counters, counts, feeds, storage, thumbnails
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+PostScopes = namedtuple('PostScopes', ('feed', 'author', 'group'))
+
+
+def group_scope(group_id):
+    """Область группы по id или None, если группы нет."""
+    if group_id is None:
+        return None
+    slug = Group.objects.filter(pk=group_id).values_list(
+        'slug', flat=True
+    ).first()
+    return counts.group_scope(slug) if slug is not None else None
+
+
+def post_scopes(post, group_id):
+    """Области лент с постом: общая, автора и группы (None без группы).
+
+    Число постов в кэше держат только общая лента и автор: лента
+    группы берёт ``Group.posts_count``.
+    """
+    return PostScopes(
+        counts.ALL, counts.author_scope(post.author_id), group_scope(group_id)
+    )
+
+
+def counted_scopes(scopes):
+    return [scopes.feed, scopes.author]
+
+
+def version_scopes(scopes):
+    return [scope for scope in scopes if scope is not None]
+
+
+def fragment_scopes(post):
+    """Все области, в чьих фрагментах может быть показан пост; ленты
+    подписок зависят от области автора."""
+    return version_scopes(post_scopes(post, post.group_id)) + [
+        caching.post_scope(post.pk)
+    ]
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_group(sender, instance, **kwargs):
+    """Запоминает старые группу и картинку: пост переносится между
+    счётчиками, а миниатюры строятся только для новой картинки.
+    Ссылку на только что загруженный файл берёт само хранилище."""
+    instance._previous_group_id = None
+    instance._previous_image = None
+    instance._image_uploaded = bool(
+        instance.image and not instance.image._committed
+    )
+    if instance.pk is not None:
+        instance._previous_group_id, instance._previous_image = (
+            Post.objects.filter(pk=instance.pk).values_list(
+                'group_id', 'image'
+            ).first() or (None, None)
+        )
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    scopes = post_scopes(instance, instance.group_id)
+    bumped = version_scopes(scopes) + [caching.post_scope(instance.pk)]
+    if created:
+        counts.increment(counted_scopes(scopes))
+        counters.shift_user(instance.author_id, 'posts_count', 1)
+        shift_group(instance.group_id, 1)
+        feeds.fan_out_post(instance)
+    else:
+        previous_group_id = getattr(instance, '_previous_group_id', None)
+        if previous_group_id != instance.group_id:
+            shift_group(previous_group_id, -1)
+            shift_group(instance.group_id, 1)
+            # Пост пропадает и из ленты прежней группы.
+            previous = group_scope(previous_group_id)
+            if previous is not None:
+                bumped.append(previous)
+    caching.bump(bumped)
+
+
+@receiver(post_save, sender=Post)
+def count_image_references(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_image', None) or ''
+    current = instance.image.name or ''
+    uploaded = getattr(instance, '_image_uploaded', False)
+    if current == previous:
+        if uploaded:
+            # Загружена та же картинка: у поста уже есть ссылка на неё.
+            storage.release(current)
+        return
+    if current and not uploaded:
+        storage.acquire(current)
+    if previous:
+        storage.release(previous)
+
+
+@receiver(post_save, sender=Post)
+def schedule_thumbnails(sender, instance, raw=False, **kwargs):
+    previous = getattr(instance, '_previous_image', None)
+    if not raw and instance.image and instance.image.name != previous:
+        thumbnails.schedule(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_image(sender, instance, **kwargs):
+    if instance.image:
+        storage.release(instance.image.name)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    scopes = post_scopes(instance, instance.group_id)
+    counts.increment(counted_scopes(scopes), -1)
+    counters.shift_user(instance.author_id, 'posts_count', -1)
+    shift_group(instance.group_id, -1)
+    caching.bump(version_scopes(scopes) + [caching.post_scope(instance.pk)])
+
+
+def shift_group(group_id, delta):
+    if group_id is not None:
+        counters.shift(Group.objects.filter(pk=group_id), 'posts_count', delta)
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.shift(
+            Post.objects.filter(pk=instance.post_id), 'comments_count', 1
+        )
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.shift(
+        Post.objects.filter(pk=instance.post_id), 'comments_count', -1
+    )
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def bump_commented_post(sender, instance, raw=False, **kwargs):
+    if not raw:
+        caching.bump([caching.post_scope(instance.post_id)])
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def bump_group(sender, instance, raw=False, **kwargs):
+    if not raw:
+        caching.bump([counts.group_scope(instance.slug)])
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def bump_follow_feed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        # Профиль автора показывает число подписчиков.
+        caching.bump([
+            counts.follow_scope(instance.user_id),
+            counts.author_scope(instance.author_id),
+        ])
+
+
+def shift_follow(follow, delta):
+    counters.shift_user(follow.author_id, 'followers_count', delta)
+    counters.shift_user(follow.user_id, 'following_count', delta)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_follow_feed(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        shift_follow(instance, 1)
+        feeds.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_follow_feed(sender, instance, **kwargs):
+    shift_follow(instance, -1)
+    feeds.prune(instance.user_id, instance.author_id)
+    if UserStats.objects.filter(
+        user_id=instance.author_id,
+        followers_count=settings.FEED_FANOUT_LIMIT
+    ).exists():
+        # Автор только что опустился до предела раскладки.
+        feeds.backfill_followers(instance.author_id)
+        caching.bump([counts.author_scope(instance.author_id)])
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
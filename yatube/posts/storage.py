@@ -0,0 +1,105 @@
+"""Хранилище картинок постов с адресацией по содержимому.
+
+Файл сохраняется под своим SHA-256 (``posts/ab/cd/abcd….jpg``), поэтому
+одинаковые загрузки указывают на один файл и один набор миниатюр sorl.
+Ссылки на файл считаются в ``ImageBlob``. Загрузка берёт ссылку
+до того, как проверить или записать файл, сигналы поста уменьшают
+счётчик у прежней картинки (и увеличивают у картинки, назначенной
+по имени), а файл без ссылок вместе с миниатюрами удаляется после
+коммита. Удаление перепроверяет счётчик под блокировкой строки
+блоба, поэтому параллельная загрузка не останется без файла.
+"""
+import logging
+import posixpath
+
+from django.apps import apps as global_apps
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import Count
+from django.utils.deconstruct import deconstructible
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from .counters import shift
+from .images import content_hash
+
+
+def blob_name(name, digest):
+    """Имя блоба в каталоге ``name`` с расширением ``name``."""
+    directory = posixpath.dirname(name)
+    extension = posixpath.splitext(name)[1].lower()
+    return posixpath.join(
+        directory, digest[:2], digest[2:4], f'{digest}{extension}'
+    )
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def save(self, name, content, max_length=None):
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = blob_name(name, content_hash(content))
+        # Пока ссылка взята, collect() этот блоб не удалит.
+        with transaction.atomic():
+            acquire(name)
+            if self.exists(name):
+                return name
+            return super().save(name, content, max_length=max_length)
+
+
+logger = logging.getLogger(__name__)
+
+post_images = ContentAddressedStorage()
+
+
+def acquire(name):
+    ImageBlob = global_apps.get_model('posts', 'ImageBlob')
+    blobs = ImageBlob.objects.filter(name=name)
+    if not shift(blobs, 'refcount', 1):
+        ImageBlob.objects.get_or_create(name=name)
+        shift(blobs, 'refcount', 1)
+
+
+def release(name):
+    ImageBlob = global_apps.get_model('posts', 'ImageBlob')
+    shift(ImageBlob.objects.filter(name=name), 'refcount', -1)
+    transaction.on_commit(lambda: collect(name))
+
+
+def collect(name):
+    """Удаляет блоб без ссылок, его миниатюры и записи sorl."""
+    ImageBlob = global_apps.get_model('posts', 'ImageBlob')
+    with transaction.atomic():
+        # Счётчик перепроверяется под блокировкой: загрузка того же
+        # файла ждёт её и после коммита запишет файл заново.
+        blob = ImageBlob.objects.select_for_update().filter(
+            name=name
+        ).first()
+        if blob is None or blob.refcount:
+            return False
+        blob.delete()
+        try:
+            default.backend.delete(ImageFile(name, post_images))
+        except (SuspiciousFileOperation, OSError):
+            # Например, старое имя вне MEDIA_ROOT: запись уже удалена,
+            # файл подберёт сборщик мусора.
+            logger.warning('Не удалось удалить файл картинки %s', name)
+    return True
+
+
+def recount_references():
+    """Заново считает ссылки на блобы после вставки постов в обход
+    сигналов. Файлы, на которые ссылок не осталось, удалит media_gc."""
+    Post = global_apps.get_model('posts', 'Post')
+    ImageBlob = global_apps.get_model('posts', 'ImageBlob')
+    references = Post.objects.exclude(image='').order_by().values(
+        'image'
+    ).annotate(refcount=Count('pk'))
+    ImageBlob.objects.all().delete()
+    ImageBlob.objects.bulk_create(
+        (ImageBlob(name=row['image'], refcount=row['refcount'])
+         for row in references.iterator()),
+        batch_size=500,
+    )
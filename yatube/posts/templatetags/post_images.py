@@ -0,0 +1,23 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.inclusion_tag('posts/includes/post_image.html')
+def post_image(post, geometry):
+    """``<picture>`` с вариантами миниатюры картинки поста или заглушка
+    того же размера, пока миниатюры строятся в фоне."""
+    image = None
+    if post.image:
+        image = thumbnails.responsive_image(post.image, geometry)
+        if image is None and not thumbnails.failed(post.image.name):
+            thumbnails.schedule(post.pk)
+    width, height = geometry.split('x')
+    return {
+        'post': post,
+        'image': image,
+        'width': width,
+        'height': height,
+    }
@@ -0,0 +1,68 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db.models import Count
+from django.test import SimpleTestCase, TestCase
+
+from posts.management.commands.benchmark import percentile
+from posts.models import Comment, Follow, Group, Post, User
+from posts.urls import urlpatterns
+
+
+class PercentileTest(SimpleTestCase):
+    def test_nearest_rank(self):
+        values = list(range(100, 0, -1))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile(values, 100), 100)
+        self.assertEqual(percentile([7], 95), 7)
+
+
+class SeedBenchmarkTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command(
+            'seed_benchmark', users=40, groups=4, posts=400, comments=200,
+            follows=100, skew=1.2, random_seed=1, stdout=StringIO()
+        )
+
+    def test_volumes(self):
+        self.assertEqual(User.objects.count(), 40)
+        self.assertEqual(Group.objects.count(), 4)
+        self.assertEqual(Post.objects.count(), 400)
+        self.assertEqual(Comment.objects.count(), 200)
+        self.assertEqual(Follow.objects.count(), 100)
+
+    def test_authors_are_skewed(self):
+        counts = list(User.objects.annotate(
+            total=Count('posts')
+        ).order_by('-total').values_list('total', flat=True))
+        # Самый плодовитый автор пишет намного больше среднего.
+        self.assertGreater(counts[0], 4 * 400 / 40)
+        self.assertLess(counts[-1], 400 / 40)
+
+    def test_benchmark_covers_every_url_and_rolls_back(self):
+        comments = Comment.objects.count()
+        follows = Follow.objects.count()
+        out = StringIO()
+        call_command('benchmark', requests=2, stdout=out)
+        lines = out.getvalue().splitlines()[1:]
+        self.assertEqual(
+            [line.split()[0] for line in lines],
+            [f'posts:{pattern.name}' for pattern in urlpatterns]
+        )
+        for line in lines:
+            with self.subTest(line=line):
+                self.assertEqual(line.split()[-1], '0')
+        self.assertEqual(Comment.objects.count(), comments)
+        self.assertEqual(Follow.objects.count(), follows)
+
+    def test_benchmark_templates_lists_pages_and_includes(self):
+        out = StringIO()
+        call_command('benchmark_templates', repeat=2, stdout=out)
+        names = [line.split()[0] for line in out.getvalue().splitlines()[1:]]
+        for name in ('posts/index.html', 'base.html',
+                     'posts/includes/paginator.html', 'includes/header.html'):
+            with self.subTest(name=name):
+                self.assertIn(name, names)
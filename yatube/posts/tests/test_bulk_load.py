@@ -0,0 +1,98 @@
+import io
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from posts.management.commands.bulk_load import iter_array
+from posts.models import Comment, FeedEntry, Follow, Group, Post
+
+DUMP = os.path.join(settings.BASE_DIR, 'dump.json')
+
+
+class IterArrayTest(SimpleTestCase):
+    def test_reads_elements_across_chunks(self):
+        with open(DUMP, encoding='utf-8') as file:
+            expected = json.load(file)
+        for chunk_size in (64, 4096):
+            with self.subTest(chunk_size=chunk_size), \
+                    open(DUMP, encoding='utf-8') as file:
+                self.assertEqual(
+                    list(iter_array(file, chunk_size)), expected
+                )
+
+    def test_numbers_split_between_chunks(self):
+        stream = io.StringIO('[12345, {"a": [1, 2]}]')
+        self.assertEqual(list(iter_array(stream, 2)), [12345, {'a': [1, 2]}])
+
+    def test_truncated_file_is_an_error(self):
+        with self.assertRaises(ValueError):
+            list(iter_array(io.StringIO('[{"a": 1}, {"b"'), 4))
+
+
+class BulkLoadTest(TestCase):
+    def load(self, path=DUMP, **options):
+        out = StringIO()
+        call_command('bulk_load', path, stdout=out, **options)
+        return out.getvalue()
+
+    def index_names(self, model):
+        with connection.cursor() as cursor:
+            return set(connection.introspection.get_constraints(
+                cursor, model._meta.db_table
+            ))
+
+    def test_loads_dump_and_rebuilds_derived_data(self):
+        output = self.load(batch_size=10)
+        self.assertIn('строк/с', output)
+        self.assertEqual(Post.objects.count(), 41)
+        self.assertEqual(Comment.objects.count(), 2)
+        self.assertEqual(Follow.objects.count(), 1)
+        post = Comment.objects.first().post
+        self.assertEqual(post.comments_count, post.comments.count())
+        follow = Follow.objects.get()
+        self.assertEqual(
+            FeedEntry.objects.filter(user=follow.user).count(),
+            follow.author.posts.count()
+        )
+        for model in (Post, Comment):
+            for index in model._meta.indexes:
+                with self.subTest(index=index.name):
+                    self.assertIn(index.name, self.index_names(model))
+
+    def test_dates_are_kept(self):
+        self.load()
+        with open(DUMP, encoding='utf-8') as file:
+            first = next(
+                item for item in json.load(file)
+                if item['model'] == 'posts.post'
+            )
+        post = Post.objects.get(pk=first['pk'])
+        self.assertEqual(
+            post.pub_date.isoformat().replace('+00:00', 'Z')[:19],
+            first['fields']['pub_date'][:19]
+        )
+
+    def test_exclude(self):
+        self.load(exclude=['posts.comment'])
+        self.assertEqual(Comment.objects.count(), 0)
+
+    def test_broken_fixture_is_rolled_back(self):
+        with tempfile.NamedTemporaryFile(
+            'w', suffix='.json', delete=False
+        ) as file:
+            file.write('[{"model": "posts.group", "pk": 1, "fields": '
+                       '{"title": "Группа", "slug": "slug", '
+                       '"description": "Описание"}}, {"model"')
+        try:
+            with self.assertRaises(CommandError):
+                self.load(file.name)
+        finally:
+            os.remove(file.name)
+        self.assertFalse(Group.objects.exists())
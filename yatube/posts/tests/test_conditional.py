@@ -0,0 +1,121 @@
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.follower = User.objects.create_user(username='Follower')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый текст', author=cls.author, group=cls.group
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def urls(self):
+        return {
+            'index': reverse('posts:index'),
+            'group_list': reverse(
+                'posts:group_list', kwargs={'slug': self.group.slug}
+            ),
+            'profile': reverse(
+                'posts:profile', kwargs={'username': self.author.username}
+            ),
+            'post_detail': reverse(
+                'posts:post_detail', kwargs={'post_id': self.post.pk}
+            ),
+            'follow_index': reverse('posts:follow_index'),
+        }
+
+    def revalidate(self, client, url, response):
+        return client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_pages_are_not_modified(self):
+        for name, url in self.urls().items():
+            with self.subTest(name=name):
+                # Первая страница с формой выдаёт CSRF-cookie, и ETag
+                # дальше считается уже с ним.
+                self.reader_client.get(url)
+                response = self.reader_client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertTrue(response['ETag'].startswith('W/'))
+                self.assertIn('private', response['Cache-Control'])
+                self.assertNotIn('Last-Modified', response)
+                again = self.revalidate(self.reader_client, url, response)
+                self.assertEqual(again.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_not_modified_skips_queries(self):
+        url = reverse('posts:index')
+        response = self.guest_client.get(url)
+        with self.assertNumQueries(0):
+            again = self.revalidate(self.guest_client, url, response)
+        self.assertEqual(again.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_changes_invalidate_validators(self):
+        urls = self.urls()
+        changes = {
+            'index': lambda: Post.objects.create(
+                text='Новый пост', author=self.reader
+            ),
+            'group_list': lambda: self.group.save(),
+            # Меняется число подписчиков в профиле.
+            'profile': lambda: Follow.objects.create(
+                user=self.follower, author=self.author
+            ),
+            'post_detail': lambda: Comment.objects.create(
+                post=self.post, author=self.reader, text='Комментарий'
+            ),
+            'follow_index': lambda: Post.objects.create(
+                text='Пост автора', author=self.author
+            ),
+        }
+        for name, change in changes.items():
+            with self.subTest(name=name):
+                response = self.reader_client.get(urls[name])
+                change()
+                again = self.revalidate(
+                    self.reader_client, urls[name], response
+                )
+                self.assertEqual(again.status_code, HTTPStatus.OK)
+
+    def test_etag_depends_on_user(self):
+        url = reverse('posts:index')
+        response = self.reader_client.get(url)
+        again = self.revalidate(self.guest_client, url, response)
+        self.assertEqual(again.status_code, HTTPStatus.OK)
+        self.assertNotEqual(again['ETag'], response['ETag'])
+
+    def test_login_invalidates_page_with_form(self):
+        User.objects.create_user(username='Commenter', password='secret')
+        client = Client()
+        credentials = {'username': 'Commenter', 'password': 'secret'}
+        client.post(reverse('users:login'), credentials)
+        url = self.urls()['post_detail']
+        response = client.get(url)
+        client.get(reverse('users:logout'))
+        client.post(reverse('users:login'), credentials)
+        # Вход сменил CSRF-токен: страницу с формой надо отдать заново.
+        again = self.revalidate(client, url, response)
+        self.assertEqual(again.status_code, HTTPStatus.OK)
+        self.assertNotEqual(again['ETag'], response['ETag'])
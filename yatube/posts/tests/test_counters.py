@@ -0,0 +1,85 @@
+import importlib
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from posts.counters import recount
+from posts.models import Comment, Follow, Group, Post, UserStats
+
+User = get_user_model()
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    def assertCounters(self, posts, group_posts, followers):
+        self.author.stats.refresh_from_db()
+        self.group.refresh_from_db()
+        self.assertEqual(self.author.stats.posts_count, posts)
+        self.assertEqual(self.group.posts_count, group_posts)
+        self.assertEqual(self.author.stats.followers_count, followers)
+
+    def test_signals_keep_counters_in_sync(self):
+        post = Post.objects.create(
+            text='text', author=self.author, group=self.group
+        )
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='comment'
+        )
+        self.assertCounters(posts=1, group_posts=1, followers=1)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+
+        comment.delete()
+        follow.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        post.group = None
+        post.save()
+        self.assertCounters(posts=1, group_posts=0, followers=0)
+        post.delete()
+        self.assertCounters(posts=0, group_posts=0, followers=0)
+
+    def test_recount_repairs_drift(self):
+        Post.objects.bulk_create(
+            Post(text=f'text {num}', author=self.author, group=self.group)
+            for num in range(3)
+        )
+        UserStats.objects.filter(user=self.reader).delete()
+        report = {
+            (model._meta.model_name, field): drifted
+            for model, field, drifted in recount(dry_run=True)
+        }
+        self.assertEqual(report[('group', 'posts_count')], 1)
+        self.assertEqual(report[('userstats', 'posts_count')], 1)
+
+        recount()
+        self.assertCounters(posts=3, group_posts=3, followers=0)
+        self.assertTrue(UserStats.objects.filter(user=self.reader).exists())
+        self.assertFalse(any(drifted for *_, drifted in recount()))
+
+    def test_migration_fills_counters(self):
+        migration = importlib.import_module('posts.migrations.0010_counters')
+        Post.objects.bulk_create(
+            Post(text=f'text {num}', author=self.author, group=self.group)
+            for num in range(2)
+        )
+        Follow.objects.create(user=self.reader, author=self.author)
+        UserStats.objects.all().delete()
+        Group.objects.update(posts_count=0)
+        migration.fill_counters(apps, None)
+        self.assertCounters(posts=2, group_posts=2, followers=1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.reader).following_count, 1
+        )
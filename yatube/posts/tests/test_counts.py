@@ -0,0 +1,104 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from posts import caching, counts
+from posts.feeds import feed_scopes, followed_authors
+from posts.models import Follow, Group, Post
+from posts.utils import CursorPaginator
+
+User = get_user_model()
+
+
+class PostCountsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='HasNoName')
+        cls.follower = User.objects.create_user(username='Follower')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_count_is_cached(self):
+        Post.objects.create(text='text', author=self.user)
+        self.assertEqual(counts.get_count(counts.ALL, Post.objects.all()), 1)
+        with self.assertNumQueries(0):
+            counts.get_count(counts.ALL, Post.objects.all())
+
+    def test_signals_update_counts(self):
+        author_scope = counts.author_scope(self.user.pk)
+        group_scope = counts.group_scope(self.group.slug)
+        posts = Post.objects.filter(author=self.user)
+        self.assertEqual(counts.get_count(counts.ALL, posts), 0)
+        self.assertEqual(counts.get_count(author_scope, posts), 0)
+        post = Post.objects.create(
+            text='text', author=self.user, group=self.group
+        )
+        self.assertEqual(cache.get(counts.cache_key(counts.ALL)), 1)
+        self.assertEqual(cache.get(counts.cache_key(author_scope)), 1)
+        # Лента группы берёт Group.posts_count, её счётчика в кэше нет.
+        self.assertIsNone(cache.get(counts.cache_key(group_scope)))
+        post.delete()
+        self.assertEqual(cache.get(counts.cache_key(counts.ALL)), 0)
+        self.assertEqual(cache.get(counts.cache_key(author_scope)), 0)
+
+    def test_moved_post_bumps_both_groups(self):
+        other = Group.objects.create(
+            title='Другая группа', slug='other-slug', description='Описание'
+        )
+        post = Post.objects.create(
+            text='text', author=self.user, group=self.group
+        )
+        post.group = other
+        with mock.patch('posts.signals.caching.bump') as bump:
+            post.save()
+        bump.assert_called_once_with([
+            counts.ALL, counts.author_scope(self.user.pk),
+            counts.group_scope(other.slug), caching.post_scope(post.pk),
+            counts.group_scope(self.group.slug),
+        ])
+
+    def test_feed_version_follows_authors_not_followers(self):
+        def feed_version():
+            return caching.get_version(*feed_scopes(
+                self.follower.pk, followed_authors(self.follower)
+            ))
+
+        before = feed_version()
+        Follow.objects.create(user=self.follower, author=self.user)
+        followed = feed_version()
+        self.assertNotEqual(followed, before)
+        with mock.patch('posts.signals.caching.bump') as bump:
+            Post.objects.create(text='text', author=self.user)
+        bumped = [
+            scope for call in bump.call_args_list for scope in call[0][0]
+        ]
+        self.assertNotIn(counts.follow_scope(self.follower.pk), bumped)
+        self.assertIn(counts.author_scope(self.user.pk), bumped)
+        Post.objects.create(text='text', author=self.user)
+        self.assertNotEqual(feed_version(), followed)
+
+    def test_stale_count_is_recounted(self):
+        Post.objects.bulk_create(
+            Post(text=f'text {num}', author=self.user) for num in range(4)
+        )
+        cache.set(counts.cache_key(counts.ALL), 1)
+        paginator = CursorPaginator(Post.objects.all(), 2, scope=counts.ALL)
+        self.assertEqual(len(paginator.page(2)), 2)
+        self.assertEqual(paginator.count, 4)
+
+    @override_settings(PAGINATOR_WINDOW=3)
+    def test_page_window(self):
+        paginator = CursorPaginator(Post.objects.all(), 1)
+        paginator.count = 100
+        self.assertEqual(list(paginator.page_window(1)), [1, 2, 3, 4])
+        self.assertEqual(list(paginator.page_window(50)), list(range(47, 54)))
+        self.assertEqual(list(paginator.page_window(100)), [97, 98, 99, 100])
@@ -0,0 +1,148 @@
+import importlib
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+
+from posts.feeds import (ENTRY_ORDERING, follow_feed, follow_page,
+                         followed_authors, rebuild)
+from posts.models import FeedEntry, Follow, Post
+from posts.utils import NEXT, encode_cursor
+
+User = get_user_model()
+
+
+class FollowFeedTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.follower = User.objects.create_user(username='Follower')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_post_is_fanned_out_to_followers(self):
+        Follow.objects.create(user=self.follower, author=self.author)
+        post = Post.objects.create(text='text', author=self.author)
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.follower, post=post).exists()
+        )
+        self.assertEqual(list(follow_feed(self.follower)), [post])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        post = Post.objects.create(text='text', author=self.author)
+        follow = Follow.objects.create(user=self.follower, author=self.author)
+        self.assertEqual(list(follow_feed(self.follower)), [post])
+        follow.delete()
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertEqual(list(follow_feed(self.follower)), [])
+
+    @override_settings(FEED_FANOUT_LIMIT=0)
+    def test_popular_author_is_read_on_demand(self):
+        Follow.objects.create(user=self.follower, author=self.author)
+        post = Post.objects.create(text='text', author=self.author)
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertEqual(list(follow_feed(self.follower)), [post])
+
+    def test_rebuild_restores_lost_entries(self):
+        Follow.objects.create(user=self.follower, author=self.author)
+        post = Post.objects.create(text='text', author=self.author)
+        FeedEntry.objects.all().delete()
+        rebuild()
+        self.assertEqual(list(follow_feed(self.follower)), [post])
+
+    def test_feed_page_is_read_from_entries_in_order(self):
+        Follow.objects.create(user=self.follower, author=self.author)
+        Post.objects.bulk_create(
+            Post(text=f'text {num}', author=self.author) for num in range(3)
+        )
+        posts = list(Post.objects.order_by('-pub_date', '-pk'))
+        rebuild()
+        followed = followed_authors(self.follower)
+        page = follow_page(
+            RequestFactory().get('/'), self.follower, followed, 'feed'
+        )
+        self.assertEqual(page.object_list, posts)
+        token = encode_cursor(NEXT, [posts[0].pub_date, posts[0].pk])
+        page = follow_page(
+            RequestFactory().get('/', {'cursor': token}), self.follower,
+            followed, 'feed'
+        )
+        self.assertEqual(page.object_list, posts[1:])
+
+    def test_feed_query_uses_index(self):
+        entries = FeedEntry.objects.filter(user=self.follower).order_by(
+            *ENTRY_ORDERING
+        )
+        plan = entries[:10].explain()
+        self.assertIn('feed_user_pub_date_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_author_back_under_limit_is_backfilled(self):
+        other = User.objects.create_user(username='Other')
+        Follow.objects.create(user=self.follower, author=self.author)
+        follow = Follow.objects.create(user=other, author=self.author)
+        post = Post.objects.create(text='text', author=self.author)
+        self.assertFalse(FeedEntry.objects.exists())
+        follow.delete()
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.follower, post=post).exists()
+        )
+        self.assertEqual(list(follow_feed(self.follower)), [post])
+
+    @override_settings(FEED_BACKFILL_SIZE=2)
+    def test_rebuild_keeps_latest_posts_per_author(self):
+        other = User.objects.create_user(username='Other')
+        Follow.objects.create(user=self.follower, author=self.author)
+        Follow.objects.create(user=self.follower, author=other)
+        Follow.objects.create(user=other, author=self.author)
+        for author in (self.author, other):
+            Post.objects.bulk_create(
+                Post(text=f'text {num}', author=author) for num in range(4)
+            )
+        rebuild()
+        latest = {
+            author: list(Post.objects.filter(author=author).order_by(
+                '-pub_date', '-pk'
+            ).values_list('pk', flat=True)[:2])
+            for author in (self.author, other)
+        }
+        self.assertCountEqual(
+            FeedEntry.objects.filter(user=self.follower).values_list(
+                'post_id', flat=True
+            ),
+            latest[self.author] + latest[other]
+        )
+        self.assertCountEqual(
+            FeedEntry.objects.filter(user=other).values_list(
+                'post_id', flat=True
+            ),
+            latest[self.author]
+        )
+
+    @override_settings(FEED_FANOUT_LIMIT=0)
+    def test_rebuild_skips_popular_authors(self):
+        Follow.objects.create(user=self.follower, author=self.author)
+        Post.objects.create(text='text', author=self.author)
+        rebuild()
+        self.assertFalse(FeedEntry.objects.exists())
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_migration_backfill_skips_popular_authors(self):
+        migration = importlib.import_module('posts.migrations.0009_feedentry')
+        popular = User.objects.create_user(username='Popular')
+        other = User.objects.create_user(username='Other')
+        Follow.objects.create(user=self.follower, author=self.author)
+        Follow.objects.create(user=self.follower, author=popular)
+        Follow.objects.create(user=other, author=popular)
+        post = Post.objects.create(text='text', author=self.author)
+        Post.objects.create(text='text', author=popular)
+        FeedEntry.objects.all().delete()
+        migration.backfill_feeds(apps, None)
+        self.assertEqual(
+            list(FeedEntry.objects.values_list('user_id', 'post_id')),
+            [(self.follower.pk, post.pk)]
+        )
@@ -8,6 +8,7 @@ from django.urls import reverse
 from django.test import Client, TestCase, override_settings
 from posts.forms import PostForm
 from posts.models import Post, Group, Comment
+from posts.storage import blob_name
 from django.contrib.auth import get_user_model
 
 
@@ -77,7 +78,9 @@ class PostsFormsTest(TestCase):
         self.assertEqual(post.text, 'Тестовый текст')
         self.assertEqual(post.author, self.user)
         self.assertEqual(post.group, PostsFormsTest.group)
-        self.assertEqual(post.image, 'posts/small.gif')
+        self.assertEqual(
+            post.image, blob_name('posts/small.gif', post.image_hash)
+        )
 
     def test_edit_post(self):
 
@@ -0,0 +1,135 @@
+import hashlib
+from io import BytesIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from PIL import Image, ImageSequence
+
+from posts.storage import blob_name
+from posts.tests.utils import TempMediaMixin
+
+User = get_user_model()
+
+ORIENTATION = 0x0112
+
+
+def camera_exif(orientation=None):
+    exif = Image.Exif()
+    exif[0x010F] = 'Camera'
+    if orientation is not None:
+        exif[ORIENTATION] = orientation
+    return exif
+
+
+def jpeg_upload(width, height, orientation=None):
+    image = Image.new('RGB', (width, height), 'red')
+    exif = camera_exif(orientation)
+    buffer = BytesIO()
+    image.save(buffer, format='JPEG', exif=exif.tobytes(), quality=100)
+    return SimpleUploadedFile(
+        'photo.jpg', buffer.getvalue(), content_type='image/jpeg'
+    )
+
+
+def animation_upload(width, height, format_, **options):
+    frames = [
+        Image.new('RGB', (width, height), color) for color in ('red', 'blue')
+    ]
+    buffer = BytesIO()
+    frames[0].save(
+        buffer, format=format_, save_all=True, append_images=frames[1:],
+        duration=[50, 80], loop=0, **options
+    )
+    return SimpleUploadedFile(
+        f'animation.{format_.lower()}', buffer.getvalue(),
+        content_type=f'image/{format_.lower()}'
+    )
+
+
+@override_settings(POST_IMAGE_MAX_SIZE=100)
+class ImageNormalizationTest(TempMediaMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='HasNoName')
+
+    def test_upload_is_downscaled_rotated_and_stripped(self):
+        post = self.create_post(jpeg_upload(400, 200, orientation=6))
+        self.assertEqual(
+            post.image.name, blob_name('posts/photo.jpg', post.image_hash)
+        )
+        self.assertEqual((post.image_width, post.image_height), (50, 100))
+        with post.image.open('rb') as file:
+            data = file.read()
+        self.assertEqual(post.image_hash, hashlib.sha256(data).hexdigest())
+        stored = Image.open(BytesIO(data))
+        self.assertEqual(stored.size, (50, 100))
+        self.assertEqual(dict(stored.getexif()), {})
+
+    def test_small_image_keeps_size(self):
+        post = self.create_post(jpeg_upload(80, 40))
+        self.assertEqual((post.image_width, post.image_height), (80, 40))
+
+    def test_unchanged_image_is_not_reencoded(self):
+        post = self.create_post(jpeg_upload(80, 40))
+        name, image_hash = post.image.name, post.image_hash
+        post.text = 'Новый текст'
+        post.save()
+        self.assertEqual(post.image.name, name)
+        self.assertEqual(post.image_hash, image_hash)
+
+    def test_removed_image_clears_metadata(self):
+        post = self.create_post(jpeg_upload(80, 40))
+        post.image = None
+        post.save()
+        self.assertEqual(
+            (post.image_width, post.image_height, post.image_hash),
+            (None, None, '')
+        )
+
+    def stored(self, post):
+        with post.image.open('rb') as file:
+            return Image.open(BytesIO(file.read()))
+
+    def test_animation_is_downscaled_and_stripped(self):
+        for format_, options in (
+            ('GIF', {}), ('PNG', {'exif': camera_exif(6).tobytes()})
+        ):
+            with self.subTest(format_=format_):
+                post = self.create_post(
+                    animation_upload(400, 200, format_, **options)
+                )
+                stored = self.stored(post)
+                self.assertEqual(stored.format, format_)
+                self.assertTrue(stored.is_animated)
+                self.assertEqual(
+                    (post.image_width, post.image_height), stored.size
+                )
+                self.assertEqual(dict(stored.getexif()), {})
+                self.assertEqual([
+                    frame.info['duration']
+                    for frame in ImageSequence.Iterator(stored)
+                ], [50, 80])
+                # EXIF PNG просит повернуть кадры на 90°.
+                expected = (50, 100) if options else (100, 50)
+                self.assertEqual(stored.size, expected)
+
+    def test_mpo_is_normalized_as_jpeg(self):
+        upload = jpeg_upload(400, 200, orientation=6)
+        open_image = Image.open
+
+        def open_as_mpo(file):
+            # Многокадровое MPO с телефона: Pillow считает его анимацией.
+            image = open_image(file)
+            image.format = 'MPO'
+            image.is_animated = True
+            return image
+
+        with mock.patch('posts.images.Image.open', open_as_mpo):
+            post = self.create_post(upload)
+        stored = self.stored(post)
+        self.assertEqual(stored.format, 'JPEG')
+        self.assertEqual(stored.size, (50, 100))
+        self.assertEqual(dict(stored.getexif()), {})
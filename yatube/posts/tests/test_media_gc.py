@@ -0,0 +1,112 @@
+import os
+import time
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from posts import storage, thumbnails
+from posts.management.commands.media_gc import Command
+from posts.models import ImageBlob, Post
+from posts.tests.utils import SMALL_GIF, TempMediaMixin
+
+User = get_user_model()
+
+DAY = 24 * 60 * 60
+
+
+def thumbnail_keys(source):
+    return default.kvstore._get(source.key, identity='thumbnails')
+
+
+class MediaGCTest(TempMediaMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='HasNoName')
+
+    def setUp(self):
+        self.post = self.create_post()
+        self.old_orphan = self.create_file(
+            storage.post_images, 'posts/00/00/orphan.gif', age=DAY
+        )
+        self.fresh_orphan = self.create_file(
+            storage.post_images, 'posts/00/00/fresh.gif', age=0
+        )
+        self.old_thumbnail = self.create_file(
+            default.storage, 'cache/00/00/orphan.jpg', age=DAY
+        )
+        self.make_old(self.post.image.path)
+
+    def create_file(self, file_storage, name, age):
+        # Мимо storage.save: хранилище картинок переименовало бы файл
+        # по хэшу содержимого.
+        path = file_storage.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(SMALL_GIF)
+        self.make_old(path, age)
+        return path
+
+    def make_old(self, path, age=DAY):
+        timestamp = time.time() - age
+        os.utime(path, (timestamp, timestamp))
+
+    def media_gc(self, **options):
+        out = StringIO()
+        call_command('media_gc', grace=60, stdout=out, **options)
+        return out.getvalue()
+
+    def test_dry_run_deletes_nothing(self):
+        output = self.media_gc(dry_run=True)
+        self.assertIn('Картинки: просмотрено 2, можно удалить 1', output)
+        self.assertIn('Миниатюры: просмотрено 1, можно удалить 1', output)
+        for path in (self.old_orphan, self.fresh_orphan, self.old_thumbnail):
+            self.assertTrue(os.path.exists(path))
+
+    def test_deletes_only_old_unreferenced_files(self):
+        output = self.media_gc(batch_size=1, workers=2)
+        self.assertIn('Картинки: просмотрено 2, удалено 1', output)
+        self.assertFalse(os.path.exists(self.old_orphan))
+        self.assertFalse(os.path.exists(self.old_thumbnail))
+        self.assertTrue(os.path.exists(self.fresh_orphan))
+        self.assertTrue(os.path.exists(self.post.image.path))
+
+    def test_drops_stale_thumbnail_entries(self):
+        thumbnails.generate(self.post.pk)
+        source = ImageFile(self.post.image)
+        self.assertTrue(thumbnail_keys(source))
+        # Мимо сигналов: как будто ссылка пропала без уборки.
+        Post.objects.filter(pk=self.post.pk).update(image='')
+        output = self.media_gc()
+        self.assertIn('Записи sorl: проверено 1, устаревших 1', output)
+        self.assertIsNone(default.kvstore.get(source))
+        self.assertIsNone(thumbnail_keys(source))
+
+    def test_keeps_file_of_blob_with_references(self):
+        name = 'posts/00/00/orphan.gif'
+        ImageBlob.objects.create(name=name, refcount=1)
+        output = self.media_gc()
+        self.assertIn('Картинки: просмотрено 2, удалено 0', output)
+        self.assertTrue(os.path.exists(self.old_orphan))
+
+    def test_upload_racing_sweep_keeps_file(self):
+        name = 'posts/00/00/orphan.gif'
+        find = Command.unreferenced_images
+
+        def find_then_upload(command, names):
+            orphans = find(command, names)
+            # Та же картинка загружается между поиском и удалением.
+            storage.acquire(name)
+            return orphans
+
+        with mock.patch.object(
+            Command, 'unreferenced_images', find_then_upload
+        ):
+            self.media_gc()
+        self.assertTrue(os.path.exists(self.old_orphan))
+        self.assertEqual(ImageBlob.objects.get(name=name).refcount, 1)
@@ -0,0 +1,107 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import pagecache
+from posts.models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class AnonymousPageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый текст', author=cls.author, group=cls.group
+        )
+        cls.other_post = Post.objects.create(
+            text='Другой текст', author=cls.author, group=cls.other_group
+        )
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.guest_client = Client()
+
+    def group_url(self, group):
+        return reverse('posts:group_list', kwargs={'slug': group.slug})
+
+    def assertCached(self, url):
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(url)
+        return response
+
+    def assertRendered(self, url):
+        response = self.guest_client.get(url)
+        self.assertIsNotNone(response.context)
+        return response
+
+    def test_anonymous_pages_are_cached_with_surrogate_keys(self):
+        urls = (
+            reverse('posts:index'),
+            self.group_url(self.group),
+            reverse('posts:profile', kwargs={'username': 'Author'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                first = self.guest_client.get(url)
+                self.assertIn(
+                    f'post:{self.post.pk}', first['Surrogate-Key'].split()
+                )
+                cached = self.assertCached(url)
+                self.assertEqual(cached.content, first.content)
+
+    def test_post_change_purges_only_affected_pages(self):
+        url = self.group_url(self.group)
+        other_url = self.group_url(self.other_group)
+        self.guest_client.get(url)
+        self.guest_client.get(other_url)
+        self.post.text = 'Новый текст'
+        self.post.save()
+        response = self.assertRendered(url)
+        self.assertContains(response, 'Новый текст')
+        self.assertCached(other_url)
+
+    def test_comment_purges_post_page(self):
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        self.guest_client.get(url)
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Комментарий'
+        )
+        self.assertContains(self.assertRendered(url), 'Комментарий')
+
+    def test_group_change_purges_pages_showing_it(self):
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        self.group.title = 'Переименованная группа'
+        self.group.save()
+        self.assertRendered(url)
+
+    def test_authenticated_pages_are_not_cached(self):
+        client = Client()
+        client.force_login(self.author)
+        url = reverse('posts:index')
+        client.get(url)
+        self.assertIsNotNone(client.get(url).context)
+
+    @override_settings(FRAGMENT_CACHE='thumbnails')
+    def test_pages_live_in_fragment_cache_alias(self):
+        response = self.guest_client.get(reverse('posts:index'))
+        key = pagecache.page_key(response.wsgi_request)
+        self.assertIsNotNone(caches['thumbnails'].get(key))
+        self.assertIsNone(caches['fragments'].get(key))
+        caches['thumbnails'].clear()
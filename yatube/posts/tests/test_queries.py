@@ -0,0 +1,104 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+from posts.urls import urlpatterns
+from posts.tests.utils import QueryBudgetMixin
+
+User = get_user_model()
+
+# Пользователь — 1 запрос (сессия читается из кэша), остальное
+# приходится на саму view.
+# Бюджеты заданы для холодного кэша фрагментов и не зависят от числа постов.
+QUERY_BUDGETS = {
+    'index': 2,
+    'group_list': 3,
+    'profile': 5,
+    'post_detail': 4,
+    'post_edit': 3,
+    'post_create': 2,
+    'add_comment': 2,
+    'search': 2,
+    'follow_index': 4,
+    'profile_follow': 11,
+    'profile_unfollow': 8,
+}
+
+
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.follower = User.objects.create_user(username='Follower')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.follower, author=cls.author)
+        for num in range(15):
+            cls.post = Post.objects.create(
+                text=f'text {num}', author=cls.author, group=cls.group
+            )
+            Comment.objects.create(
+                post=cls.post, author=cls.reader, text=f'comment {num}'
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.follower_client = Client()
+        self.follower_client.force_login(self.follower)
+
+    def get_requests(self):
+        post_id = {'post_id': self.post.pk}
+        username = {'username': self.author.username}
+        return {
+            'index': (self.reader_client, reverse('posts:index')),
+            'group_list': (self.reader_client, reverse(
+                'posts:group_list', kwargs={'slug': self.group.slug}
+            )),
+            'profile': (self.reader_client, reverse(
+                'posts:profile', kwargs=username
+            )),
+            'post_detail': (self.reader_client, reverse(
+                'posts:post_detail', kwargs=post_id
+            )),
+            'post_edit': (self.author_client, reverse(
+                'posts:post_edit', kwargs=post_id
+            )),
+            'post_create': (self.author_client, reverse('posts:post_create')),
+            'add_comment': (self.reader_client, reverse(
+                'posts:add_comment', kwargs=post_id
+            )),
+            'search': (self.reader_client, reverse(
+                'posts:search'
+            ) + '?q=text&group=test-slug'),
+            'follow_index': (self.follower_client, reverse(
+                'posts:follow_index'
+            )),
+            'profile_follow': (self.reader_client, reverse(
+                'posts:profile_follow', kwargs=username
+            )),
+            'profile_unfollow': (self.reader_client, reverse(
+                'posts:profile_unfollow', kwargs=username
+            )),
+        }
+
+    def test_every_view_has_budget(self):
+        names = {pattern.name for pattern in urlpatterns}
+        self.assertEqual(names, set(QUERY_BUDGETS))
+
+    def test_views_fit_query_budget(self):
+        for name, (client, url) in self.get_requests().items():
+            with self.subTest(name=name):
+                cache.clear()
+                with self.assertQueryBudget(QUERY_BUDGETS[name]):
+                    client.get(url)
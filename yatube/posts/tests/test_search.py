@@ -0,0 +1,115 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Group, Post
+from posts.search import RANK_ORDERING, search_posts
+from posts.utils import NEXT, encode_cursor
+
+User = get_user_model()
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.other = User.objects.create_user(username='Other')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.strong = Post.objects.create(
+            title='Котики', text='Котики, котики и ещё котики',
+            author=cls.author, group=cls.group
+        )
+        cls.weak = Post.objects.create(
+            title='Разное', text='Про собак, котиков и котики',
+            author=cls.other
+        )
+        cls.unrelated = Post.objects.create(
+            title='Погода', text='Сегодня дождь', author=cls.author
+        )
+
+    def search(self, query):
+        return list(
+            search_posts(Post.objects.all(), query).order_by(*RANK_ORDERING)
+        )
+
+    def test_results_are_ranked(self):
+        self.assertEqual(self.search('котики'), [self.strong, self.weak])
+
+    def test_index_follows_updates_and_deletes(self):
+        post = Post.objects.create(
+            title='Новое', text='Ёжики в тумане', author=self.author
+        )
+        self.assertEqual(self.search('ёжики'), [post])
+        post.text = 'Лошадки'
+        post.save()
+        self.assertEqual(self.search('ёжики'), [])
+        post.delete()
+        self.assertEqual(self.search('лошадки'), [])
+
+    def test_query_syntax_is_escaped(self):
+        self.assertEqual(self.search('котики OR "*('), [])
+        self.assertEqual(self.search('***'), [])
+
+    @override_settings(POSTS_SEARCH_BACKEND='posts.search.LikeSearch')
+    def test_fallback_backend(self):
+        self.assertEqual(
+            set(self.search('котики')), {self.strong, self.weak}
+        )
+
+    def test_view_filters_by_group_and_author(self):
+        client = Client()
+        url = reverse('posts:search')
+        for params, expected in (
+            ({'q': 'котики'}, [self.strong, self.weak]),
+            ({'q': 'котики', 'group': self.group.slug}, [self.strong]),
+            ({'q': 'котики', 'author': self.other.username}, [self.weak]),
+            ({}, None),
+        ):
+            with self.subTest(params=params):
+                page_obj = client.get(url, params).context['page_obj']
+                if expected is None:
+                    self.assertIsNone(page_obj)
+                else:
+                    self.assertEqual(list(page_obj), expected)
+
+    @override_settings(POSTS_PER_PAGE=1)
+    def test_view_keyset_pages_keep_query(self):
+        client = Client()
+        url = reverse('posts:search')
+        response = client.get(url, {'q': 'котики'})
+        page_obj = response.context['page_obj']
+        self.assertEqual(list(page_obj), [self.strong])
+        self.assertTrue(page_obj.query_prefix.startswith('q='))
+        response = client.get(
+            url, {'q': 'котики', 'cursor': page_obj.next_cursor}
+        )
+        self.assertEqual(list(response.context['page_obj']), [self.weak])
+
+    @override_settings(POSTS_PER_PAGE=1)
+    def test_crafted_rank_cursor_falls_back_to_first_page(self):
+        url = reverse('posts:search')
+        for rank in ('not a rank', '1e400', [1.0], None):
+            with self.subTest(rank=rank):
+                token = encode_cursor(NEXT, [rank, self.strong.pk])
+                response = Client().get(url, {'q': 'котики', 'cursor': token})
+                page_obj = response.context['page_obj']
+                self.assertEqual(list(page_obj), [self.strong])
+                self.assertIsNone(page_obj.previous_cursor)
+
+    def test_admin_uses_search_backend(self):
+        admin = User.objects.create_superuser(
+            username='Admin', email='admin@example.com', password='pass'
+        )
+        client = Client()
+        client.force_login(admin)
+        response = client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'котики'}
+        )
+        self.assertEqual(
+            set(response.context['cl'].result_list), {self.strong, self.weak}
+        )
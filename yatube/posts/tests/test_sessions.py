@@ -0,0 +1,73 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Group, Post
+
+User = get_user_model()
+
+
+def session_queries(context):
+    return [
+        query['sql'] for query in context.captured_queries
+        if 'django_session' in query['sql']
+    ]
+
+
+class SessionTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='HasNoName')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый текст', author=cls.user, group=cls.group
+        )
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+
+    def urls(self):
+        return (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': 'HasNoName'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+
+    def test_anonymous_browsing_has_no_session(self):
+        client = Client()
+        for url in self.urls():
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as context:
+                    client.get(url)
+                self.assertEqual(session_queries(context), [])
+                self.assertNotIn('sessionid', client.cookies)
+
+    def test_logged_in_session_is_read_from_cache(self):
+        client = Client()
+        client.force_login(self.user)
+        for url in self.urls():
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as context:
+                    client.get(url)
+                self.assertEqual(session_queries(context), [])
+
+    def test_session_queries_command(self):
+        out = StringIO()
+        call_command('session_queries', repeat=1, stdout=out)
+        output = out.getvalue()
+        self.assertIn('cached_db', output)
+        self.assertIn('аноним', output)
+        self.assertIn('есть сессия: нет', output)
@@ -0,0 +1,84 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from posts import storage
+from posts.models import ImageBlob
+from posts.tests.utils import SMALL_GIF, TempMediaMixin, upload
+
+User = get_user_model()
+
+OTHER_GIF = SMALL_GIF.replace(b'\xFF\xFF\xFF', b'\x00\xFF\x00')
+
+
+class ContentAddressedStorageTest(TempMediaMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='HasNoName')
+
+    def refcount(self, name):
+        return ImageBlob.objects.get(name=name).refcount
+
+    def test_identical_uploads_share_one_blob(self):
+        first = self.create_post(upload(name='first.gif'))
+        second = self.create_post(upload(name='second.gif'))
+        name = first.image.name
+        self.assertEqual(second.image.name, name)
+        self.assertEqual(
+            name, storage.blob_name('posts/first.gif', first.image_hash)
+        )
+        self.assertEqual(self.refcount(name), 2)
+
+        first.delete()
+        self.assertFalse(storage.collect(name))
+        self.assertTrue(storage.post_images.exists(name))
+
+        second.delete()
+        self.assertTrue(storage.collect(name))
+        self.assertFalse(storage.post_images.exists(name))
+        self.assertFalse(ImageBlob.objects.filter(name=name).exists())
+
+    def test_replaced_image_is_released(self):
+        post = self.create_post(upload())
+        previous = post.image.name
+        post.image = upload(OTHER_GIF)
+        post.save()
+        self.assertNotEqual(post.image.name, previous)
+        self.assertEqual(self.refcount(post.image.name), 1)
+        self.assertEqual(self.refcount(previous), 0)
+        self.assertTrue(storage.collect(previous))
+        self.assertTrue(storage.post_images.exists(post.image.name))
+
+    def test_unchanged_image_keeps_refcount(self):
+        post = self.create_post(upload())
+        post.text = 'Новый текст'
+        post.save()
+        self.assertEqual(self.refcount(post.image.name), 1)
+
+    def test_reuploaded_image_keeps_refcount(self):
+        post = self.create_post(upload())
+        post.image = upload(name='again.gif')
+        post.save()
+        self.assertEqual(self.refcount(post.image.name), 1)
+
+    def test_collect_racing_upload_keeps_file(self):
+        post = self.create_post(upload())
+        name = post.image.name
+        post.delete()
+        exists = storage.post_images.exists
+
+        def exists_then_collect(name):
+            found = exists(name)
+            # Сборщик успевает между проверкой файла и сохранением поста.
+            storage.collect(name)
+            return found
+
+        with mock.patch.object(
+            storage.post_images, 'exists', side_effect=exists_then_collect
+        ):
+            post = self.create_post(upload())
+        self.assertEqual(post.image.name, name)
+        self.assertEqual(self.refcount(name), 1)
+        self.assertTrue(storage.post_images.exists(name))
@@ -0,0 +1,116 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import caching, counts, thumbnails
+from posts.models import Follow
+from posts.tests.utils import TempMediaMixin
+
+User = get_user_model()
+
+
+class ThumbnailsTest(TempMediaMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='HasNoName')
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+
+    def test_pending_thumbnail_renders_placeholder(self):
+        self.create_post()
+        response = Client().get(reverse('posts:index'))
+        self.assertContains(response, 'img/placeholder.svg')
+
+    @override_settings(POST_THUMBNAIL_ASYNC=False)
+    def test_all_sizes_are_generated_on_save(self):
+        post = self.create_post()
+        for geometry in settings.POST_THUMBNAIL_GEOMETRIES:
+            for format_, quality, size in thumbnails.variants(geometry):
+                with self.subTest(geometry=geometry, size=size):
+                    self.assertIsNotNone(
+                        thumbnails.backend.get_cached_thumbnail(
+                            post.image, size,
+                            **thumbnails.variant_options(format_, quality)
+                        )
+                    )
+        response = Client().get(reverse('posts:index'))
+        self.assertNotContains(response, 'img/placeholder.svg')
+        self.assertContains(response, '<img class="card-img')
+
+    @override_settings(
+        POST_THUMBNAIL_ASYNC=False, POST_THUMBNAIL_SCALES=(0.5, 1),
+        POST_IMAGE_FORMATS={'PNG': 90, 'NOSUCHFORMAT': 50}
+    )
+    def test_picture_lists_widths_and_supported_formats(self):
+        self.create_post()
+        response = Client().get(reverse('posts:index'))
+        self.assertContains(response, '<source type="image/png"', count=1)
+        self.assertContains(response, ' 240w, ')
+        self.assertContains(response, ' 480w"')
+        self.assertNotContains(response, 'NOSUCHFORMAT')
+
+    def test_only_new_images_are_scheduled(self):
+        with mock.patch('posts.thumbnails.schedule') as schedule:
+            post = self.create_post()
+            schedule.assert_called_once_with(post.pk)
+            post.text = 'Новый текст'
+            post.save()
+            schedule.assert_called_once_with(post.pk)
+
+    def test_failed_generation_is_not_rescheduled(self):
+        with mock.patch('posts.thumbnails.schedule'):
+            post = self.create_post()
+        with mock.patch.object(
+            thumbnails.backend, 'get_thumbnail', side_effect=OSError
+        ), self.assertRaises(OSError):
+            thumbnails.generate(post.pk)
+        self.assertTrue(thumbnails.failed(post.image.name))
+        with mock.patch('posts.thumbnails.schedule') as schedule:
+            response = Client().get(reverse('posts:index'))
+        self.assertContains(response, 'img/placeholder.svg')
+        schedule.assert_not_called()
+
+    @mock.patch.object(thumbnails, 'in_memory_db', return_value=False)
+    def test_submit_runs_generation_in_pool_once(self, in_memory_db):
+        executor = ThreadPoolExecutor(max_workers=1)
+        started = threading.Event()
+        release = threading.Event()
+
+        def generate(post_id):
+            started.set()
+            release.wait(5)
+
+        with mock.patch.object(
+            thumbnails, 'get_executor', return_value=executor
+        ), mock.patch.object(
+            thumbnails, 'generate', side_effect=generate
+        ) as generated:
+            thumbnails.submit(42)
+            self.assertTrue(started.wait(5))
+            # Пока генерация идёт, повторная постановка не нужна.
+            thumbnails.submit(42)
+            release.set()
+            executor.shutdown(wait=True)
+        generated.assert_called_once_with(42)
+        self.assertNotIn(42, thumbnails._pending)
+
+    @override_settings(POST_THUMBNAIL_ASYNC=False)
+    def test_generation_bumps_only_post_scopes(self):
+        follower = User.objects.create_user(username='Follower')
+        Follow.objects.create(user=follower, author=self.user)
+        post = self.create_post()
+        with mock.patch('posts.thumbnails.caching.bump') as bump:
+            thumbnails.generate(post.pk)
+        bump.assert_called_once_with([
+            counts.ALL, counts.author_scope(self.user.pk),
+            caching.post_scope(post.pk),
+        ])
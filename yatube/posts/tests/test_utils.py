@@ -0,0 +1,98 @@
+from django.contrib.auth import get_user_model
+from django.test import RequestFactory, TestCase, override_settings
+
+from posts.models import Post
+from posts.utils import (NEXT, PREVIOUS, CursorPaginator, decode_cursor,
+                         encode_cursor, paginate_page)
+
+User = get_user_model()
+
+
+@override_settings(POSTS_PER_PAGE=5)
+class CursorPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='HasNoName')
+        Post.objects.bulk_create(
+            Post(text=f'text {num}', author=cls.user) for num in range(12)
+        )
+        cls.expected = list(Post.objects.order_by('-pub_date', '-pk'))
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def get_page(self, **params):
+        return paginate_page(
+            self.factory.get('/', params), Post.objects.all()
+        )
+
+    def test_cursor_round_trip(self):
+        token = encode_cursor('n', ['2022-09-01T11:09:00.123456+00:00', 7])
+        self.assertEqual(
+            decode_cursor(token),
+            ('n', ['2022-09-01T11:09:00.123456+00:00', 7])
+        )
+        self.assertIsNone(decode_cursor('not a cursor'))
+
+    def test_walk_forward_and_back(self):
+        seen = []
+        page = self.get_page()
+        self.assertIsNone(page.previous_cursor)
+        pages = [page]
+        while True:
+            seen.extend(page.object_list)
+            if not page.next_cursor:
+                break
+            page = self.get_page(cursor=page.next_cursor)
+            pages.append(page)
+        self.assertEqual(seen, self.expected)
+        self.assertEqual(len(pages), 3)
+
+        back = self.get_page(cursor=pages[-1].previous_cursor)
+        self.assertEqual(back.object_list, pages[1].object_list)
+        first = self.get_page(cursor=back.previous_cursor)
+        self.assertEqual(first.object_list, pages[0].object_list)
+        self.assertIsNone(first.previous_cursor)
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        page = self.get_page(cursor='garbage')
+        self.assertEqual(list(page), self.expected[:5])
+
+    def test_page_number_fallback(self):
+        page = self.get_page(page=3)
+        self.assertFalse(page.cursor_mode)
+        self.assertEqual(list(page), self.expected[10:])
+
+    def test_cursor_page_does_not_count(self):
+        paginator = CursorPaginator(Post.objects.all(), 5)
+        with self.assertNumQueries(1):
+            paginator.get_cursor_page()
+
+    def test_crafted_cursor_falls_back_to_first_page(self):
+        post = self.expected[0]
+        tokens = [
+            encode_cursor(NEXT, [None, None]),
+            encode_cursor(NEXT, [None, post.pk]),
+            encode_cursor(PREVIOUS, [post.pub_date, None]),
+            encode_cursor(NEXT, [[1], {'a': 1}]),
+            encode_cursor(NEXT, [1.5, 2.5]),
+            encode_cursor(NEXT, [post.pub_date, float('nan')]),
+            encode_cursor(NEXT, [True, False]),
+            encode_cursor(NEXT, [post.pub_date, 10 ** 30]),
+            encode_cursor(NEXT, ['not a date', post.pk]),
+            encode_cursor(NEXT, [post.pub_date, 'not a pk']),
+        ]
+        for token in tokens:
+            with self.subTest(token=token):
+                page = self.get_page(cursor=token)
+                self.assertEqual(list(page), self.expected[:5])
+                self.assertIsNone(page.previous_cursor)
+
+    def test_crafted_cursor_does_not_break_views(self):
+        token = encode_cursor(NEXT, [None, None])
+        for url in ('/', f'/profile/{self.user.username}/',
+                    f'/posts/{self.expected[0].pk}/'):
+            with self.subTest(url=url):
+                response = self.client.get(url, {'cursor': token})
+                self.assertEqual(response.status_code, 200)
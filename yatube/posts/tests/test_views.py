@@ -284,7 +284,10 @@ class PostsPagesTest(TestCase):
 
     def test_index_cache(self):
         response = self.authorized_client.get(reverse('posts:index'))
-        Post.objects.filter(pk=1).delete()
+        # update() обходит сигналы, поэтому версия фрагмента не меняется.
+        Post.objects.filter(pk=PostsPagesTest.post.pk).update(
+            text='Изменено в обход сигналов'
+        )
 
         self.assertEqual(
             response.content,
@@ -295,3 +298,31 @@ class PostsPagesTest(TestCase):
             response.content,
             self.authorized_client.get(reverse('posts:index')).content
         )
+
+    def test_index_cache_invalidated_on_delete(self):
+        Post.objects.create(text='Будет удалён', author=PostsPagesTest.user)
+        response = self.authorized_client.get(reverse('posts:index'))
+        Post.objects.get(text='Будет удалён').delete()
+
+        self.assertNotEqual(
+            response.content,
+            self.authorized_client.get(reverse('posts:index')).content
+        )
+
+    def test_follow_cache_is_per_user(self):
+        follower = User.objects.create_user(username='Follower')
+        stranger = User.objects.create_user(username='Stranger')
+        Follow.objects.create(user=follower, author=PostsPagesTest.user)
+        follower_client = Client()
+        follower_client.force_login(follower)
+        stranger_client = Client()
+        stranger_client.force_login(stranger)
+
+        self.assertContains(
+            follower_client.get(reverse('posts:follow_index')),
+            PostsPagesTest.post.text
+        )
+        self.assertNotContains(
+            stranger_client.get(reverse('posts:follow_index')),
+            PostsPagesTest.post.text
+        )
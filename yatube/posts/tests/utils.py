@@ -0,0 +1,69 @@
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connections
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from posts.models import Post
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+def upload(content=SMALL_GIF, name='small.gif'):
+    return SimpleUploadedFile(name, content, content_type='image/gif')
+
+
+class QueryBudgetMixin:
+    """Проверка, что код укладывается в заданное число SQL-запросов."""
+
+    @contextmanager
+    def assertQueryBudget(self, budget, using='default'):
+        with CaptureQueriesContext(connections[using]) as context:
+            yield context
+        queries = '\n'.join(
+            f'{number}. {query["sql"]}'
+            for number, query in enumerate(context.captured_queries, 1)
+        )
+        self.assertLessEqual(
+            len(context), budget,
+            f'{len(context)} запросов при бюджете {budget}:\n{queries}'
+        )
+
+
+class TempMediaMixin:
+    """Временный ``MEDIA_ROOT`` на класс тестов и пост ``cls.user``
+    с картинкой."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        cls.media_settings = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_settings.enable()
+        try:
+            super().setUpClass()
+        except Exception:
+            cls.media_settings.disable()
+            raise
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_settings.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    def create_post(self, image=None):
+        return Post.objects.create(
+            text='Тестовый текст', author=self.user,
+            image=upload() if image is None else image,
+        )
@@ -0,0 +1,216 @@
+"""Фоновая генерация миниатюр картинок постов.
+
+После сохранения поста с новой картинкой все размеры из
+``POST_THUMBNAIL_GEOMETRIES`` строятся в пуле потоков, а не при первом
+показе страницы: каждый в нескольких ширинах (``POST_THUMBNAIL_SCALES``)
+и, кроме исходного формата, в форматах ``POST_IMAGE_FORMATS``, которые
+умеет кодировать установленный Pillow. Пока миниатюр нет в key-value
+store sorl, шаблонный тег ``post_image`` выводит заглушку и ставит
+генерацию в очередь. Неудача запоминается в кэше по имени картинки
+на ``POST_THUMBNAIL_RETRY_AFTER`` секунд, и до тех пор битая картинка
+в очередь не ставится.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, connections, transaction
+from PIL import Image
+from sorl.thumbnail import default
+from sorl.thumbnail.base import EXTENSIONS, ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+
+from . import caching
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_lock = threading.Lock()
+_pending = set()
+
+# sorl знает расширения только для JPEG, PNG, GIF и WEBP.
+EXTENSIONS.setdefault('AVIF', 'avif')
+
+
+class CachedThumbnailBackend(ThumbnailBackend):
+    """Умеет искать готовую миниатюру, не генерируя её."""
+
+    def get_options(self, source, options):
+        # Те же умолчания, что и в ThumbnailBackend.get_thumbnail, иначе
+        # имя миниатюры и ключ в key-value store не совпадут.
+        options = dict(options)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        return options
+
+    def get_thumbnail_name(self, file_, geometry_string, **options):
+        source = ImageFile(file_)
+        return self._get_thumbnail_filename(
+            source, geometry_string, self.get_options(source, options)
+        )
+
+    def get_cached_thumbnail(self, file_, geometry_string, **options):
+        name = self.get_thumbnail_name(file_, geometry_string, **options)
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+
+backend = CachedThumbnailBackend()
+
+
+def get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.POST_THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+        return _executor
+
+
+def modern_formats():
+    """Форматы из ``POST_IMAGE_FORMATS``, которые Pillow умеет сохранять."""
+    Image.init()
+    return [
+        (format_, quality)
+        for format_, quality in settings.POST_IMAGE_FORMATS.items()
+        if format_ in Image.SAVE
+    ]
+
+
+def scale_geometry(geometry, scale):
+    width, height = (int(size) for size in geometry.split('x'))
+    return f'{round(width * scale)}x{round(height * scale)}'
+
+
+def variant_options(format_=None, quality=None):
+    options = dict(settings.POST_THUMBNAIL_OPTIONS)
+    if format_ is not None:
+        options.update(format=format_, quality=quality)
+    return options
+
+
+def variants(geometry):
+    """(формат, качество, размер) всех вариантов миниатюры в порядке
+    генерации; ``None`` — исходный формат картинки."""
+    scales = sorted(set(settings.POST_THUMBNAIL_SCALES) | {1})
+    for format_, quality in [(None, None)] + modern_formats():
+        for scale in scales:
+            yield format_, quality, scale_geometry(geometry, scale)
+
+
+def variant_url(image, format_, quality, size):
+    name = backend.get_thumbnail_name(
+        image, size, **variant_options(format_, quality)
+    )
+    return default.storage.url(name)
+
+
+def responsive_image(image, geometry):
+    """Адреса вариантов миниатюры для ``<picture>`` или None, пока
+    они строятся.
+
+    Варианты генерируются по порядку, поэтому достаточно проверить
+    в key-value store последний: остальные адреса вычисляются по имени.
+    """
+    specs = list(variants(geometry))
+    format_, quality, size = specs[-1]
+    if backend.get_cached_thumbnail(
+        image, size, **variant_options(format_, quality)
+    ) is None:
+        return None
+    srcsets = {}
+    for format_, quality, size in specs:
+        width = size.split('x')[0]
+        srcsets.setdefault(format_, []).append(
+            f'{variant_url(image, format_, quality, size)} {width}w'
+        )
+    return {
+        'src': variant_url(image, None, None, geometry),
+        'srcset': ', '.join(srcsets.pop(None)),
+        'sources': [
+            {'type': Image.MIME[format_], 'srcset': ', '.join(srcset)}
+            for format_, srcset in srcsets.items()
+        ],
+    }
+
+
+def failure_key(name):
+    return f'posts:thumbnails:failed:{name}'
+
+
+def failed(name):
+    """Недавно ли не удалось построить миниатюры картинки ``name``."""
+    return cache.get(failure_key(name)) is not None
+
+
+def generate(post_id):
+    """Строит все варианты миниатюр картинки поста."""
+    from .signals import fragment_scopes
+
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None or not post.image:
+        return
+    try:
+        for geometry in settings.POST_THUMBNAIL_GEOMETRIES:
+            for format_, quality, size in variants(geometry):
+                backend.get_thumbnail(
+                    post.image, size, **variant_options(format_, quality)
+                )
+    except Exception:
+        cache.set(
+            failure_key(post.image.name), True,
+            settings.POST_THUMBNAIL_RETRY_AFTER
+        )
+        raise
+    # Фрагменты с заглушкой больше не нужны.
+    caching.bump(fragment_scopes(post))
+
+
+def run(post_id):
+    try:
+        generate(post_id)
+    except Exception:
+        logger.exception('Не удалось построить миниатюры поста %s', post_id)
+    finally:
+        with _lock:
+            _pending.discard(post_id)
+        # Поток пула живёт долго: соединения не должны висеть открытыми.
+        connections.close_all()
+
+
+def in_memory_db():
+    return connection.vendor == 'sqlite' and connection.is_in_memory_db()
+
+
+def submit(post_id):
+    """Ставит генерацию в очередь, если она ещё не стоит там."""
+    if in_memory_db():
+        # Другие потоки видят общую базу в памяти только с ошибками
+        # блокировки (SQLITE_LOCKED), поэтому строим на месте.
+        generate(post_id)
+        return
+    with _lock:
+        if post_id in _pending:
+            return
+        _pending.add(post_id)
+    get_executor().submit(run, post_id)
+
+
+def schedule(post_id):
+    """Генерация после коммита: поток должен увидеть сохранённый пост."""
+    if settings.POST_THUMBNAIL_ASYNC:
+        transaction.on_commit(lambda: submit(post_id))
+    else:
+        generate(post_id)
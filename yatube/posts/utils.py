@@ -1,8 +1,261 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
+import datetime
+import json
+import math
+
 from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import EmptyPage, Page, Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from . import counts
+
+CURSOR_PARAM = 'cursor'
+PAGE_PARAM = 'page'
+NEXT = 'n'
+PREVIOUS = 'p'
+
+# Что может испортить курсор: None и нескалярные значения не проходят
+# проверку, а слишком большие числа и неверные строки падают уже
+# в to_python() или при подстановке в запрос.
+CURSOR_ERRORS = (ValidationError, TypeError, ValueError, OverflowError)
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """Сохраняет микросекунды: курсор должен совпадать с ключом точно."""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(direction, values):
+    """Упаковывает направление и значения ключа в непрозрачный токен."""
+    raw = json.dumps([direction, list(values)], cls=CursorEncoder)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Возвращает (направление, значения) или None для битого токена."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        direction, values = json.loads(raw.decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        return None
+    if direction not in (NEXT, PREVIOUS) or not isinstance(values, list):
+        return None
+    return direction, values
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинатор: страница выбирается по значениям ключа сортировки,
+    а не через OFFSET, поэтому стоимость не зависит от глубины.
+
+    Ключ — поле сортировки модели (например, ``-pub_date``) плюс ``pk``
+    для однозначного порядка при совпадающих датах. Если задана область
+    ``scope``, число объектов для режима ``?page=N`` берётся из
+    кэшируемых счётчиков ``posts.counts``; готовое число (например,
+    денормализованный счётчик) можно передать в ``count``.
+    """
+
+    def __init__(self, object_list, per_page, ordering=None, scope=None,
+                 count=None, **kwargs):
+        if ordering is None:
+            ordering = self.default_ordering(object_list)
+        self.ordering = tuple(ordering)
+        self.scope = scope
+        self.approximate = scope is not None or count is not None
+        if count is not None:
+            self.count = count
+        super().__init__(
+            object_list.order_by(*self.ordering), per_page, **kwargs
+        )
+
+    @cached_property
+    def count(self):
+        if self.scope is None:
+            return super().count
+        return counts.get_count(self.scope, self.object_list)
+
+    def validate_number(self, number):
+        """Счётчик мог отстать: перед отказом пересчитываем точно."""
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            if not self.approximate:
+                raise
+            if self.scope is not None:
+                counts.invalidate([self.scope])
+            self.approximate = False
+            self.count = self.object_list.count()
+            self.__dict__.pop('num_pages', None)
+            return super().validate_number(number)
+
+    def page(self, number):
+        # Срез не ограничивается счётчиком: он может быть приблизительным.
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        return self._get_page(
+            self.object_list[bottom:bottom + self.per_page], number, self
+        )
+
+    def page_window(self, number):
+        """Номера страниц вокруг ``number`` вместо всего ``page_range``."""
+        window = settings.PAGINATOR_WINDOW
+        return range(
+            max(1, number - window),
+            min(self.num_pages, number + window) + 1
+        )
+
+    @staticmethod
+    def default_ordering(queryset):
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        key = ordering[0] if ordering else '-pk'
+        if key.lstrip('-') in ('pk', 'id'):
+            return (key,)
+        return (key, '-pk' if key.startswith('-') else 'pk')
+
+    def _key_values(self, obj):
+        values = []
+        for name in self.ordering:
+            name = name.lstrip('-')
+            values.append(getattr(obj, 'pk' if name == 'id' else name))
+        return values
+
+    def _field(self, model, name):
+        """Поле модели или ``output_field`` аннотации (например,
+        ``search_rank``), через которое приводится значение курсора."""
+        if name == 'pk':
+            return model._meta.pk
+        try:
+            return model._meta.get_field(name)
+        except FieldDoesNotExist:
+            annotation = self.object_list.query.annotations.get(name)
+            if annotation is None:
+                raise ValidationError('Неверный курсор.')
+            return annotation.output_field
+
+    def _parse_values(self, values):
+        if len(values) != len(self.ordering):
+            raise ValidationError('Неверный курсор.')
+        model = self.object_list.model
+        parsed = []
+        for name, value in zip(self.ordering, values):
+            if isinstance(value, bool) or not isinstance(
+                value, (str, int, float)
+            ):
+                raise ValidationError('Неверный курсор.')
+            if isinstance(value, int) and not -2 ** 63 <= value < 2 ** 63:
+                # Иначе PostgreSQL ответит ошибкой и сорвёт транзакцию.
+                raise ValidationError('Неверный курсор.')
+            value = self._field(model, name.lstrip('-')).to_python(value)
+            if value is None or (
+                isinstance(value, float) and not math.isfinite(value)
+            ):
+                raise ValidationError('Неверный курсор.')
+            parsed.append(value)
+        return parsed
+
+    def seek(self, values, forward=True):
+        """Условие «строго после» (или «строго до») ключа ``values``."""
+        condition = Q()
+        equal = {}
+        for name, value in zip(self.ordering, values):
+            field = name.lstrip('-')
+            before = name.startswith('-') == forward
+            lookup = f'{field}__{"lt" if before else "gt"}'
+            condition |= Q(**equal, **{lookup: value})
+            equal[field] = value
+        return condition
+
+    def _reverse_ordering(self):
+        return tuple(
+            name[1:] if name.startswith('-') else f'-{name}'
+            for name in self.ordering
+        )
+
+    def _fetch(self, values, forward):
+        queryset = self.object_list
+        if values is not None:
+            queryset = queryset.filter(self.seek(values, forward))
+        if not forward:
+            queryset = queryset.order_by(*self._reverse_ordering())
+        return list(queryset[:self.per_page + 1])
+
+    def get_cursor_page(self, cursor=None):
+        """Возвращает страницу после/до курсора; битый курсор — первая."""
+        decoded = decode_cursor(cursor) if cursor else None
+        values = None
+        items = None
+        if decoded is not None:
+            try:
+                values = self._parse_values(decoded[1])
+                items = self._fetch(values, decoded[0] == NEXT)
+            except CURSOR_ERRORS:
+                values = None
+        forward = values is None or decoded[0] == NEXT
+        if items is None:
+            items = self._fetch(None, True)
+        has_more = len(items) > self.per_page
+        items = items[:self.per_page]
+        if not forward:
+            items.reverse()
+        has_next = has_more if forward else True
+        has_previous = values is not None and (forward or has_more)
+        page = Page(items, 1, self)
+        page.cursor_mode = True
+        page.cursor = cursor if values is not None else None
+        page.next_cursor = (
+            encode_cursor(NEXT, self._key_values(items[-1]))
+            if has_next and items else None
+        )
+        page.previous_cursor = (
+            encode_cursor(PREVIOUS, self._key_values(items[0]))
+            if has_previous and items else None
+        )
+        return page
+
+
+def batched(iterable, size):
+    """Разбивает поток на списки по ``size`` элементов."""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def query_prefix(request):
+    """Прочие GET-параметры (например, поисковый запрос) для ссылок
+    пагинатора: ``q=...&`` или пустая строка."""
+    params = request.GET.copy()
+    params.pop(PAGE_PARAM, None)
+    params.pop(CURSOR_PARAM, None)
+    return f'{params.urlencode()}&' if params else ''
 
 
-def paginate_page(request, post_list):
-    paginator = Paginator(post_list, settings.POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+def paginate_page(request, post_list, ordering=None, scope=None,
+                  count=None):
+    """Постраничный вывод: по умолчанию keyset-курсор ``?cursor=``,
+    старый режим ``?page=N`` оставлен как запасной."""
+    paginator = CursorPaginator(
+        post_list, settings.POSTS_PER_PAGE, ordering=ordering, scope=scope,
+        count=count
+    )
+    page_number = request.GET.get(PAGE_PARAM)
+    if page_number is not None and CURSOR_PARAM not in request.GET:
+        page = paginator.get_page(page_number)
+        page.cursor_mode = False
+        page.page_window = paginator.page_window(page.number)
+        page.cursor = page.next_cursor = page.previous_cursor = None
+    else:
+        page = paginator.get_cursor_page(request.GET.get(CURSOR_PARAM))
+    page.query_prefix = query_prefix(request)
+    return page
@@ -1,8 +1,17 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from .models import Follow, Post, Group, User
-from .forms import CommentForm, PostForm
+from .forms import CommentForm, PostForm, SearchForm
 from django.contrib.auth.decorators import login_required
+from core.routers import read_replica
+from .pagecache import anonymous_page_cache
 from .utils import paginate_page
+from . import caching, counts, pagecache
+from .conditional import (
+    conditional, follow_sources, group_sources, index_sources, post_sources,
+    profile_sources,
+)
+from .feeds import feed_scopes, follow_page, followed_authors
+from .search import RANK_ORDERING, search_posts
 
 
 def is_author(func):
@@ -13,33 +22,55 @@ def is_author(func):
     return check_user
 
 
+@read_replica
+@anonymous_page_cache
+@conditional(index_sources)
 def index(request):
     template = 'posts/index.html'
     posts = Post.objects.select_related('group', 'author')
-    page_obj = paginate_page(request, posts)
+    page_obj = paginate_page(request, posts, scope=counts.ALL)
+    pagecache.tag(request, counts.ALL, *pagecache.post_keys(page_obj))
     context: dict = {
-        'page_obj': page_obj
+        'page_obj': page_obj,
+        **caching.fragment_context(counts.ALL),
     }
     return render(request, template, context)
 
 
+@read_replica
+@anonymous_page_cache
+@conditional(group_sources)
 def group_posts(request, slug):
     template = 'posts/group_list.html'
     group = get_object_or_404(Group, slug=slug)
     posts = group.posts.select_related('author', 'group')
-    page_obj = paginate_page(request, posts)
+    scope = counts.group_scope(group.slug)
+    page_obj = paginate_page(request, posts, count=group.posts_count)
+    pagecache.tag(request, scope, *pagecache.post_keys(page_obj))
     context: dict = {
         'group': group,
-        'page_obj': page_obj
+        'page_obj': page_obj,
+        **caching.fragment_context(scope),
     }
     return render(request, template, context)
 
 
+@read_replica
+@anonymous_page_cache
+@conditional(profile_sources)
 def profile(request, username):
     template = 'posts/profile.html'
-    user = get_object_or_404(User, username=username)
+    user = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
     user_posts = user.posts.select_related('author', 'group')
-    page_obj = paginate_page(request, user_posts)
+    scope = counts.author_scope(user.pk)
+    stats = getattr(user, 'stats', None)
+    page_obj = paginate_page(
+        request, user_posts, scope=scope,
+        count=stats.posts_count if stats else None
+    )
+    pagecache.tag(request, scope, *pagecache.post_keys(page_obj))
     following = request.user.is_authenticated and Follow.objects.filter(
         user=request.user, author=user.id
     ).exists()
@@ -47,24 +78,54 @@ def profile(request, username):
         'author': user,
         'page_obj': page_obj,
         'following': following,
-        'is_self': request.user == user
+        'is_self': request.user == user,
+        **caching.fragment_context(scope),
     }
     return render(request, template, context)
 
 
+@read_replica
+@anonymous_page_cache
+@conditional(post_sources)
 def post_detail(request, post_id):
     template = 'posts/post_detail.html'
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id
+    )
+    pagecache.tag(
+        request, counts.author_scope(post.author_id),
+        *pagecache.post_keys([post])
+    )
     context: dict = {
         'post': post,
         'form': CommentForm(request.POST or None),
         'page_obj': paginate_page(
-            request, post.comments.select_related('author', 'post')
+            request, post.comments.select_related('author'),
+            count=post.comments_count
         ),
     }
     return render(request, template, context)
 
 
+def search(request):
+    template = 'posts/search.html'
+    form = SearchForm(request.GET or None)
+    page_obj = None
+    if form.is_valid() and form.cleaned_data['q']:
+        posts = Post.objects.select_related('author', 'group')
+        if form.cleaned_data['group']:
+            posts = posts.filter(group__slug=form.cleaned_data['group'])
+        if form.cleaned_data['author']:
+            posts = posts.filter(
+                author__username=form.cleaned_data['author']
+            )
+        page_obj = paginate_page(
+            request, search_posts(posts, form.cleaned_data['q']),
+            ordering=RANK_ORDERING
+        )
+    return render(request, template, {'form': form, 'page_obj': page_obj})
+
+
 @login_required
 def post_create(request):
     template = 'posts/create_post.html'
@@ -83,7 +144,7 @@ def post_edit(request, post_id):
     is_edit = True
     post = get_object_or_404(Post,
                              pk=post_id)
-    if post.author != request.user:
+    if post.author_id != request.user.pk:
         return redirect('posts:post_detail', post_id)
     form = PostForm(
         request.POST or None,
@@ -116,16 +177,22 @@ def add_comment(request, post_id):
 
 
 @login_required
+@conditional(follow_sources)
 def follow_index(request):
     template = 'posts/follow.html'
     user = request.user
-    followed_posts = Post.objects.filter(
-        author__following__user=request.user
+    followed = followed_authors(user)
+    fragments = caching.fragment_context(*feed_scopes(user.pk, followed))
+    # Новый пост автора меняет ключ счётчика, а не сбрасывает
+    # счётчики всех его подписчиков.
+    scope = counts.versioned_scope(
+        counts.follow_scope(user.pk), fragments['cache_version']
     )
-    page_obj = paginate_page(request, followed_posts)
+    page_obj = follow_page(request, user, followed, scope)
     context = {
         'page_obj': page_obj,
         'user': user,
+        **fragments,
     }
     return render(request, template, context)
 
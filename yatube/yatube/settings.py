@@ -53,6 +53,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
+    'core.querylog.QueryLogMiddleware',
+    'core.profiler.ProfilerMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -70,12 +73,21 @@ INTERNAL_IPS = [
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates с замером времени рендеринга для core.metrics.
+        'BACKEND': 'core.backends.templates.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Без DEBUG разобранные шаблоны живут в памяти процесса;
+            # core.warmup заполняет этот кэш при старте воркера.
+            'loaders': TEMPLATE_LOADERS if DEBUG else [
+                ('django.template.loaders.cached.Loader', TEMPLATE_LOADERS),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -87,17 +99,75 @@ TEMPLATES = [
     },
 ]
 
+# Вместо APP_DIRS загрузчик app_directories указан в TEMPLATE_LOADERS.
+SILENCED_SYSTEM_CHECKS = ['debug_toolbar.W006']
+
 WSGI_APPLICATION = 'yatube.wsgi.application'
+# Компилировать шаблоны из DIRS при загрузке yatube.wsgi.
+TEMPLATE_WARMUP = True
 
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# СУБД выбирается окружением: YATUBE_DB_ENGINE=sqlite (по умолчанию),
+# postgresql или postgresql_pool — PostgreSQL с пулом соединений
+# в процессе (core.backends.postgresql_pool, нужен psycopg2).
+DATABASE_ENGINES = {
+    'sqlite': 'django.db.backends.sqlite3',
+    'postgresql': 'django.db.backends.postgresql',
+    'postgresql_pool': 'core.backends.postgresql_pool',
+}
+DATABASE_ENGINE = os.environ.get('YATUBE_DB_ENGINE', 'sqlite')
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'ENGINE': DATABASE_ENGINES[DATABASE_ENGINE],
+        'NAME': os.environ.get(
+            'YATUBE_DB_NAME', os.path.join(BASE_DIR, 'db.sqlite3')
+        ),
+        # Соединение живёт между запросами; перед запросом
+        # core.db проверяет его, если включены CONN_HEALTH_CHECKS.
+        'CONN_MAX_AGE': int(os.environ.get('YATUBE_DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': os.environ.get(
+            'YATUBE_DB_HEALTH_CHECKS', '1'
+        ) == '1',
+    }
+}
+if DATABASE_ENGINE != 'sqlite':
+    DATABASES['default'].update({
+        'USER': os.environ.get('YATUBE_DB_USER', 'yatube'),
+        'PASSWORD': os.environ.get('YATUBE_DB_PASSWORD', ''),
+        'HOST': os.environ.get('YATUBE_DB_HOST', ''),
+        'PORT': os.environ.get('YATUBE_DB_PORT', ''),
+    })
+if DATABASE_ENGINE == 'postgresql_pool':
+    # Соединения возвращаются в пул после каждого запроса.
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS'] = {
+        'MIN_CONNS': int(os.environ.get('YATUBE_DB_POOL_MIN', 1)),
+        'MAX_CONNS': int(os.environ.get('YATUBE_DB_POOL_MAX', 10)),
     }
+
+# Псевдонимы реплик для чтения лент (core.routers); заполняются
+# в yatube.settings_production из YATUBE_DB_REPLICAS.
+DATABASE_REPLICAS = []
+# Сколько секунд после записи клиент читает только с основной базы.
+REPLICA_STICKY_SECONDS = 10
+
+# PRAGMA для каждого нового соединения SQLite (core.db): NORMAL в WAL
+# безопасен и не делает fsync на каждый коммит, cache_size в КиБ
+# (отрицательное число) и temp_store держат страницы и временные
+# таблицы в памяти, busy_timeout ждёт блокировку, а не падает
+# с «database is locked». Режим WAL, который пускает читателей
+# параллельно с писателем, хранится в самом файле базы и включается
+# один раз миграцией core 0001_sqlite_wal.
+SQLITE_PRAGMAS = {
+    'synchronous': 'NORMAL',
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+    'mmap_size': 256 * 1024 * 1024,
+    'busy_timeout': 5000,
 }
 
 
@@ -150,15 +220,184 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 POSTS_PER_PAGE = 10
 
+# Сколько соседних страниц показывать вокруг текущей в пагинаторе.
+PAGINATOR_WINDOW = 3
+
+# Счётчики постов для пагинатора хранятся в кэше и правятся сигналами;
+# TTL ограничивает расхождение после массовых правок в обход ORM.
+POSTS_COUNT_TTL = 60 * 60
+# Брать число строк из статистики СУБД вместо точного COUNT(*).
+POSTS_COUNT_ESTIMATE = False
+
+# Лента подписок: посты авторов, у которых подписчиков не больше
+# FEED_FANOUT_LIMIT, раскладываются по лентам при публикации; посты
+# более популярных авторов подмешиваются при чтении.
+FEED_FANOUT_LIMIT = 1000
+# Сколько последних постов автора добавлять в ленту при подписке.
+FEED_BACKFILL_SIZE = 1000
+FEED_BATCH_SIZE = 500
+
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+# Загруженные картинки ужимаются до этого размера по большей стороне
+# и перекодируются без метаданных (posts.images).
+POST_IMAGE_MAX_SIZE = 2048
+POST_IMAGE_QUALITY = {'JPEG': 85, 'WEBP': 80}
+
+# Размеры миниатюр картинок постов, которые строятся в фоне сразу после
+# загрузки (posts.thumbnails); пока их нет, шаблоны показывают заглушку.
+POST_THUMBNAIL_GEOMETRIES = ('480x170', '960x339')
+POST_THUMBNAIL_OPTIONS = {'crop': 'center', 'upscale': True}
+# Дополнительные ширины для srcset (1 — сам размер) и современные
+# форматы с качеством; формат пропускается, если Pillow его не кодирует.
+POST_THUMBNAIL_SCALES = (0.5, 1, 2)
+POST_IMAGE_FORMATS = {'AVIF': 60, 'WEBP': 80}
+POST_THUMBNAIL_ASYNC = True
+POST_THUMBNAIL_WORKERS = 2
+# Сколько секунд не пытаться снова, если миниатюры картинки не построились.
+POST_THUMBNAIL_RETRY_AFTER = 60 * 60
+
+# Фрагменты шаблонов инвалидируются версиями областей (posts.caching),
+# поэтому TTL нужен только для вытеснения давно не читавшихся страниц.
+FRAGMENT_CACHE_TTL = 60 * 60
+# Страницы для анонимов сбрасываются по суррогатным ключам
+# (posts.pagecache), TTL лишь вытесняет давно не читавшиеся.
+PAGE_CACHE_TTL = 24 * 60 * 60
+
+# Кэш задаётся окружением. Под несколькими воркерами gunicorn нужен
+# общий бэкенд, иначе у каждого процесса свои фрагменты и сброс
+# версий до других процессов не доходит:
+#   YATUBE_CACHE_BACKEND=file YATUBE_CACHE_LOCATION=/var/tmp/yatube
+#   YATUBE_CACHE_BACKEND=memcached \
+#       YATUBE_CACHE_LOCATION=unix:/run/memcached/{alias}.sock
+# В LOCATION можно подставить {alias}: у каждого псевдонима будет свой
+# каталог или свой memcached со своим размером (-m). Для locmem и file
+# размер ограничивает YATUBE_CACHE_<ALIAS>_MAX_ENTRIES.
+# Бэкенды Django, считающие попадания и промахи для core.metrics.
+CACHE_BACKENDS = {
+    'locmem': 'core.backends.cache.LocMemCache',
+    'file': 'core.backends.cache.FileBasedCache',
+    'memcached': 'core.backends.cache.MemcachedCache',
+}
+CACHE_BACKEND = os.environ.get('YATUBE_CACHE_BACKEND', 'locmem')
+CACHE_LOCATION = os.environ.get(
+    'YATUBE_CACHE_LOCATION', os.path.join(BASE_DIR, 'cache', '{alias}')
+)
+
+
+def cache_alias(alias, timeout, max_entries, cull_frequency):
+    """Настройки одного псевдонима кэша для CACHE_BACKEND."""
+    config = {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND],
+        'TIMEOUT': timeout,
+        # Метка псевдонима в метриках core.backends.cache.
+        'ALIAS': alias,
     }
+    if CACHE_BACKEND == 'locmem':
+        config['LOCATION'] = alias
+    else:
+        config['LOCATION'] = CACHE_LOCATION.format(alias=alias)
+    if CACHE_BACKEND != 'memcached':
+        config['OPTIONS'] = {
+            'MAX_ENTRIES': int(os.environ.get(
+                f'YATUBE_CACHE_{alias.upper()}_MAX_ENTRIES', max_entries
+            )),
+            # При переполнении удаляется 1/CULL_FREQUENCY записей.
+            'CULL_FREQUENCY': cull_frequency,
+        }
+    return config
+
+
+CACHES = {
+    # Версии областей, счётчики постов, время изменений: маленькие
+    # и дорогие при потере, вытесняются понемногу.
+    'default': cache_alias('default', 300, 10000, 10),
+    # Фрагменты {% cache %} и страницы для анонимов: дёшево
+    # перестроить, при переполнении вытесняется половина.
+    'fragments': cache_alias('fragments', FRAGMENT_CACHE_TTL, 5000, 2),
+    # Сессии: потеря разлогинивает пользователя.
+    'sessions': cache_alias('sessions', 14 * 24 * 60 * 60, 20000, 10),
+    # Key-value store sorl-thumbnail; при промахе читается из базы.
+    'thumbnails': cache_alias('thumbnails', None, 20000, 4),
+}
+FRAGMENT_CACHE = 'fragments'
+SESSION_CACHE_ALIAS = 'sessions'
+THUMBNAIL_CACHE = 'thumbnails'
+
+# Сессия читается из общего кэша, база — только при промахе.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+# Сообщения и CSRF-токен живут в cookie, чтобы анонимный просмотр
+# не создавал сессий (manage.py session_queries показывает запросы).
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+CSRF_USE_SESSIONS = False
+
+# Метрики запросов (core.metrics): воркер сбрасывает свои счётчики
+# в общий кэш не чаще раза в METRICS_FLUSH_SECONDS, /metrics/ отдаёт
+# сумму по воркерам. Без YATUBE_METRICS_TOKEN /metrics/ открыт только
+# для INTERNAL_IPS.
+METRICS_CACHE = 'default'
+METRICS_FLUSH_SECONDS = 10
+METRICS_TTL = 24 * 60 * 60
+METRICS_TOKEN = os.environ.get('YATUBE_METRICS_TOKEN', '')
+
+# Журнал медленных запросов (core.querylog) включается порогом
+# YATUBE_SLOW_QUERY_MS: запросы дольше него пишутся в лог с view
+# и строкой кода, для доли SLOW_QUERY_EXPLAIN_RATE — с планом. Форма
+# запроса, повторённая за HTTP-запрос N_PLUS_ONE_THRESHOLD раз,
+# отмечается как N+1.
+SLOW_QUERY_MS = (
+    float(os.environ['YATUBE_SLOW_QUERY_MS'])
+    if os.environ.get('YATUBE_SLOW_QUERY_MS') else None
+)
+SLOW_QUERY_EXPLAIN_RATE = float(
+    os.environ.get('YATUBE_SLOW_QUERY_EXPLAIN_RATE', 0.1)
+)
+N_PLUS_ONE_THRESHOLD = 5
+
+# Выборочный профайлер (core.profiler): запрос с заголовком
+# X-Profile: <YATUBE_PROFILER_TOKEN> или доля YATUBE_PROFILER_SAMPLE_RATE
+# всех запросов профилируется, стеки пишутся в PROFILER_DIR по имени
+# view в формате collapsed или speedscope.
+PROFILER_TOKEN = os.environ.get('YATUBE_PROFILER_TOKEN', '')
+PROFILER_SAMPLE_RATE = float(
+    os.environ.get('YATUBE_PROFILER_SAMPLE_RATE', 0)
+)
+PROFILER_INTERVAL = 0.005
+PROFILER_FORMAT = os.environ.get('YATUBE_PROFILER_FORMAT', 'collapsed')
+PROFILER_DIR = os.environ.get(
+    'YATUBE_PROFILER_DIR', os.path.join(BASE_DIR, 'profiles')
+)
+
+# Строка JSON на каждый запрос пишется в лог core.metrics на уровне
+# INFO; YATUBE_METRICS_LOG_LEVEL=INFO включает её. Медленные запросы
+# и N+1 пишутся в core.querylog на уровне WARNING.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'core.metrics': {
+            'handlers': ['console'],
+            'level': os.environ.get('YATUBE_METRICS_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+        'core.querylog': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
 }
 
 DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
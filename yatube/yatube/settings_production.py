@@ -0,0 +1,52 @@
+"""Настройки продакшена: DJANGO_SETTINGS_MODULE=yatube.settings_production.
+
+PostgreSQL по умолчанию (YATUBE_DB_ENGINE можно переопределить, например
+на postgresql_pool), реплики для чтения лент из YATUBE_DB_REPLICAS —
+хосты через запятую с теми же именем базы и пользователем, общий
+файловый кэш между воркерами, строка метрик в лог на каждый запрос,
+кэшированные и прогретые при старте шаблоны.
+"""
+import os
+
+os.environ.setdefault('YATUBE_DB_ENGINE', 'postgresql')
+os.environ.setdefault('YATUBE_CACHE_BACKEND', 'file')
+os.environ.setdefault('YATUBE_CACHE_LOCATION', '/var/tmp/yatube/{alias}')
+os.environ.setdefault('YATUBE_METRICS_LOG_LEVEL', 'INFO')
+
+from .settings import *  # noqa: E402,F401,F403
+from .settings import (  # noqa: E402
+    DATABASES, MIDDLEWARE, TEMPLATE_LOADERS, TEMPLATES,
+)
+
+DEBUG = False
+SECRET_KEY = os.environ['YATUBE_SECRET_KEY']
+if os.environ.get('YATUBE_ALLOWED_HOSTS'):
+    ALLOWED_HOSTS = os.environ['YATUBE_ALLOWED_HOSTS'].split(',')
+
+# Кэширующий загрузчик шаблонов не зависит от DEBUG.
+TEMPLATES[0]['OPTIONS']['loaders'] = [
+    ('django.template.loaders.cached.Loader', TEMPLATE_LOADERS),
+]
+TEMPLATE_WARMUP = True
+
+SESSION_COOKIE_SECURE = True
+CSRF_COOKIE_SECURE = True
+
+DATABASE_REPLICAS = []
+replica_hosts = os.environ.get('YATUBE_DB_REPLICAS', '')
+for number, host in enumerate(filter(None, replica_hosts.split(',')), 1):
+    alias = f'replica_{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host,
+        # В тестах реплика — та же база, что и основная.
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+# Раньше сессий и остального: запись в любом middleware тоже
+# должна прилепить клиента к основной базе.
+MIDDLEWARE = [
+    MIDDLEWARE[0], 'core.routers.ReplicaMiddleware', *MIDDLEWARE[1:]
+]